@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class AnalysisCache:
+    """
+    LRU cache of analysis results keyed by a hash of note content and importance.
+
+    At most ``max_entries`` results are kept, each for at most ``ttl_seconds``
+    (``None`` keeps them until evicted). With a ``path`` the cache is loaded
+    from that JSON file on creation and written back by ``save``.
+    ``hits``/``misses`` count lookups.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = None, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, object]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(content: str, important: bool) -> str:
+        return hashlib.sha256(f"{int(important)}\0{content}".encode("utf-8")).hexdigest()
+
+    def get(self, content: str, important: bool) -> Optional[Dict[str, object]]:
+        key = self.key(content, important)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, content: str, important: bool, result: Dict[str, object]) -> None:
+        key = self.key(content, important)
+        with self._lock:
+            self._entries[key] = (time.time(), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        with self._lock:
+            self._entries.clear()
+            for key, stored_at, result in stored:
+                if not self._expired(stored_at):
+                    self._entries[key] = (stored_at, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Write the cache to ``path`` atomically, least recently used first."""
+        if not self.path:
+            return
+        with self._lock:
+            stored = [[key, stored_at, result] for key, (stored_at, result) in self._entries.items()
+                      if not self._expired(stored_at)]
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".cache-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                json.dump(stored, out)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
@@ -0,0 +1,122 @@
+import json
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class AnalysisLogWriter:
+    """
+    Appends analysis records to the log from one thread, in batches.
+
+    The log file stays open while the writer runs. Records are collected
+    until ``batch_size`` are waiting or ``interval_ms`` has passed since the
+    first one, then written and flushed together; ``stop`` writes whatever
+    is left. ``fmt`` is ``text`` for the classic
+    ``Analyzed: '...' | Words: N | Priority: X`` lines or ``jsonl`` for one
+    JSON object per line.
+
+    ``on_flushed`` is called from the writer thread with the ``token`` of
+    every record in a batch once that batch has reached the file; a batch
+    that failed to write is not reported.
+    """
+
+    TEXT = "text"
+    JSONL = "jsonl"
+    FORMATS = (TEXT, JSONL)
+
+    def __init__(self, path: str, fmt: str = TEXT, batch_size: int = 50, interval_ms: int = 200,
+                 on_flushed: Optional[Callable[[List[object]], None]] = None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown log format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = max(batch_size, 1)
+        self.interval_ms = interval_ms
+        self.on_flushed = on_flushed
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._running = False
+
+    def start(self) -> None:
+        if self._running:
+            return
+
+        self._running = True
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(
+            target=self._worker,
+            name="AnalysisLog-Thread",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write every pending record, then close the log."""
+        if not self._running:
+            return
+
+        self._running = False
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+        self._file.close()
+        self._file = None
+
+    def write(self, record: Dict[str, object], token: object = None) -> None:
+        self._queue.put((record, token))
+
+    def format(self, record: Dict[str, object]) -> str:
+        if self.fmt == self.JSONL:
+            return json.dumps(record, ensure_ascii=False) + "\n"
+        return f"Analyzed: '{record['preview']}...' | Words: {record['words']} | Priority: {record['priority']}\n"
+
+    def _worker(self) -> None:
+        stopping = False
+        while not stopping:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            batch = [record]
+            deadline = time.monotonic() + self.interval_ms / 1000
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            self._flush(batch)
+
+        leftovers = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not None:
+                leftovers.append(record)
+        if leftovers:
+            self._flush(leftovers)
+
+    def _flush(self, batch: List[Tuple[Dict[str, object], object]]) -> None:
+        try:
+            self._file.write("".join(self.format(record) for record, _ in batch))
+            self._file.flush()
+        except Exception as e:
+            print(f"\n[ANALYSIS LOG ERROR]: {e}")
+            return
+        tokens = [token for _, token in batch if token is not None]
+        if tokens and self.on_flushed is not None:
+            try:
+                self.on_flushed(tokens)
+            except Exception as e:
+                print(f"\n[ANALYSIS LOG ERROR]: {e}")
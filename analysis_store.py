@@ -0,0 +1,184 @@
+import os
+import struct
+import threading
+from array import array
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from file_lock import FileLock
+
+HEADER = b"# notes-analysis v1\n"
+# note id, word count, urgent flag (REMOVED marks a deleted note)
+RECORD = struct.Struct("<qlb")
+REMOVED = -1
+
+
+class AnalysisStore:
+    """
+    Analysis results per note id, kept next to the notes file.
+
+    In memory the results are held column by column (``ids``, ``words``,
+    ``urgent`` arrays plus a row lookup by id), so filters scan flat arrays.
+    On disk they are fixed-size binary records appended after a header;
+    the last record for an id wins, and ``remove`` appends a record with
+    the ``REMOVED`` flag that drops the id. ``refresh`` picks up records appended
+    by other processes (appends and rewrites hold ``<path>.lock``), and the
+    file is rewritten without superseded rows when it is opened with most
+    of its records stale.
+    """
+
+    PRIORITIES = ("Normal", "URGENT")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = array("q")
+        self.words = array("l")
+        self.urgent = array("b")
+        self._row: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + ".lock")
+        self._identity = None
+        self._read_pos = 0
+        self._records = 0
+        self.refresh()
+        if self._records > 2 * len(self.ids) + 1000:
+            self.compact()
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def __contains__(self, note_id: int) -> bool:
+        return note_id in self._row
+
+    def get(self, note_id: int) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._row.get(note_id)
+            if row is None:
+                return None
+            return {"words": self.words[row], "priority": self.PRIORITIES[self.urgent[row]]}
+
+    def put(self, note_id: int, record: Dict[str, object]) -> None:
+        self.put_many([(note_id, record)])
+
+    def put_many(self, results: Iterable[Tuple[int, Dict[str, object]]]) -> None:
+        """Store results given as ``(note_id, record)`` with ``words`` and ``priority``/``important``."""
+        rows = [(note_id, int(record["words"]), int(self._is_urgent(record))) for note_id, record in results]
+        if not rows:
+            return
+        data = b"".join(RECORD.pack(*row) for row in rows)
+        with self._lock, self._file_lock.exclusive():
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.write(fd, HEADER)
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            self.refresh()
+
+    def remove(self, note_id: int) -> None:
+        self.remove_many([note_id])
+
+    def remove_many(self, note_ids: Iterable[int]) -> None:
+        """Drop the results of ``note_ids``, e.g. because the notes were deleted."""
+        with self._lock, self._file_lock.exclusive():
+            self.refresh()
+            data = b"".join(RECORD.pack(note_id, 0, REMOVED) for note_id in note_ids if note_id in self._row)
+            if not data:
+                return
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self.refresh()
+
+    def ids_where(self, min_words: Optional[int] = None, max_words: Optional[int] = None,
+                  priority: Optional[str] = None) -> Set[int]:
+        with self._lock:
+            want_urgent = None if priority is None else int(priority == "URGENT")
+            return {
+                note_id for note_id, words, urgent in zip(self.ids, self.words, self.urgent)
+                if (min_words is None or words >= min_words)
+                and (max_words is None or words <= max_words)
+                and (want_urgent is None or urgent == want_urgent)
+            }
+
+    def refresh(self) -> None:
+        """Read records appended to the file since it was last read."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            size = st.st_size
+            if (st.st_dev, st.st_ino) != self._identity or size < self._read_pos:
+                self._reset()
+                self._identity = (st.st_dev, st.st_ino)
+            if size == self._read_pos:
+                return
+
+            with open(self.path, "rb") as f:
+                if self._read_pos == 0:
+                    if f.read(len(HEADER)) != HEADER:
+                        raise ValueError(f"{self.path} is not an analysis file")
+                    self._read_pos = len(HEADER)
+                f.seek(self._read_pos)
+                data = f.read(size - self._read_pos)
+            whole = len(data) - len(data) % RECORD.size
+            for row in RECORD.iter_unpack(data[:whole]):
+                self._apply(*row)
+            self._records += whole // RECORD.size
+            self._read_pos += whole
+
+    def compact(self) -> None:
+        """Rewrite the file with one record per note id."""
+        with self._lock, self._file_lock.exclusive():
+            self.refresh()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as out:
+                out.write(HEADER)
+                out.write(b"".join(RECORD.pack(*row) for row in zip(self.ids, self.words, self.urgent)))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+            st = os.stat(self.path)
+            self._identity = (st.st_dev, st.st_ino)
+            self._records = len(self.ids)
+            self._read_pos = st.st_size
+
+    def _reset(self) -> None:
+        self.ids = array("q")
+        self.words = array("l")
+        self.urgent = array("b")
+        self._row = {}
+        self._read_pos = 0
+        self._records = 0
+
+    def _apply(self, note_id: int, words: int, urgent: int) -> None:
+        row = self._row.get(note_id)
+        if urgent == REMOVED:
+            if row is not None:
+                self._remove_row(row)
+        elif row is None:
+            self._row[note_id] = len(self.ids)
+            self.ids.append(note_id)
+            self.words.append(words)
+            self.urgent.append(urgent)
+        else:
+            self.words[row] = words
+            self.urgent[row] = urgent
+
+    def _remove_row(self, row: int) -> None:
+        """Drop ``row`` by moving the last row into its place."""
+        del self._row[self.ids[row]]
+        last = len(self.ids) - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.words[row] = self.words[last]
+            self.urgent[row] = self.urgent[last]
+            self._row[self.ids[row]] = row
+        for column in (self.ids, self.words, self.urgent):
+            column.pop()
+
+    @staticmethod
+    def _is_urgent(record: Dict[str, object]) -> bool:
+        if "priority" in record:
+            return record["priority"] == "URGENT"
+        return bool(record.get("important"))
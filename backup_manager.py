@@ -1,16 +1,98 @@
+import argparse
+import hashlib
+import json
 import os
 import shutil
+import tempfile
 import threading
 import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from file_lock import FileLock
+from file_watch import FileWatcher, inotify_available
+from note_index import IdMark, IndexEntry, Tombstone, scan_blocks
+from note_storage import NoteStorage
+from sharded_storage import ShardedNoteStorage
+from snapshots import SnapshotStore
+from storage_backend import StorageBackend
+
+COPY_CHUNK_SIZE = 1 << 20
 
 
 class BackupManager:
+    """
+    Backs up the notes file when it changes.
+
+    With the default ``events`` trigger the backup thread sleeps until a
+    write is reported, by ``storage`` (its write listeners) or by a
+    ``FileWatcher`` on the source (inotify, which also sees other
+    processes; without a ``storage`` it falls back to polling every
+    ``interval_seconds``). Writes are coalesced: the backup runs once no
+    write has arrived for ``debounce_seconds``, but no later than
+    ``max_staleness_seconds`` (default ``interval_seconds``) after the first
+    unsaved write. Pending changes are backed up on ``stop``. The
+    ``interval`` trigger keeps the old fixed cadence.
+
+    A plain notes file is backed up incrementally: ``backup_file`` holds a
+    full snapshot and ``<backup_file>.delta`` the bytes appended to the
+    source since then, described by ``<backup_file>.state``. A run is
+    skipped when size and mtime are unchanged, and only the new tail is
+    copied when the source grew without its backed-up part changing. A
+    full snapshot is taken instead when the source was replaced (a
+    compaction), shrank, had already-copied bytes rewritten, or when the
+    deltas outgrow ``max_delta_ratio`` times the snapshot. Deletes in
+    ``NoteStorage`` are appended tombstones, so they travel in the delta.
+    ``restore`` rebuilds the notes file from the snapshot plus deltas. The
+    state file, written last, commits a run: it records which snapshot the
+    delta belongs to and how many delta bytes are valid, so a run that
+    crashes half-way leaves nothing that ``restore`` would pick up.
+
+    Other backends (``storage`` that is not a ``NoteStorage``) get a full
+    ``backup_to`` copy, skipped when their files are unchanged.
+
+    Independently of ``backup_file``, a changed source is also saved as a
+    compressed, checksummed generation in ``snapshots`` (by default
+    ``<backup_file>.snapshots``) at most every ``snapshot_interval_seconds``;
+    ``None`` turns generations off.
+    """
+
+    EVENTS = "events"
+    INTERVAL = "interval"
+    TRIGGERS = (EVENTS, INTERVAL)
+
+    FULL = "full"
+    DELTA = "delta"
+    SKIPPED = "skipped"
+    TAIL_CHECK_BYTES = 4096
     
-    def __init__(self, source_file: str = "notes.txt", backup_file: str = "notes.bak", interval_seconds: int = 10):
+    def __init__(self, source_file: str = "notes.txt", backup_file: str = "notes.bak", interval_seconds: int = 10,
+                 storage: Optional[StorageBackend] = None, compaction_threshold: Optional[float] = None,
+                 max_delta_ratio: float = 1.0, snapshot_interval_seconds: Optional[int] = 600,
+                 snapshots: Optional[SnapshotStore] = None, trigger: str = EVENTS, debounce_seconds: float = 2.0,
+                 max_staleness_seconds: Optional[float] = None):
+        if trigger not in self.TRIGGERS:
+            raise ValueError(f"Unknown backup trigger: {trigger}")
         self.source_file = source_file
         self.backup_file = backup_file
         self.interval_seconds = interval_seconds
+        self.storage = storage
+        self.compaction_threshold = compaction_threshold
+        self.max_delta_ratio = max_delta_ratio
+        self.delta_file = backup_file + ".delta"
+        self.state_file = backup_file + ".state"
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        if snapshots is None and snapshot_interval_seconds is not None:
+            snapshots = SnapshotStore(backup_file + ".snapshots")
+        self.snapshots = snapshots
+        self.trigger = trigger
+        self.debounce_seconds = debounce_seconds
+        self.max_staleness_seconds = interval_seconds if max_staleness_seconds is None else max_staleness_seconds
         self._stop_event = threading.Event()
+        self._changed = threading.Condition()
+        self._first_write: Optional[float] = None
+        self._last_write = 0.0
+        self._watcher: Optional[FileWatcher] = None
         self._thread: threading.Thread = None
         self._running = False
     
@@ -20,8 +102,16 @@ class BackupManager:
         
         self._running = True
         self._stop_event.clear()
+        if self.trigger == self.EVENTS:
+            if self.storage is not None:
+                self.storage.add_write_listener(self.notify_write)
+            if self.storage is None or inotify_available():
+                self._watcher = FileWatcher(self.source_file, self.notify_write, poll_seconds=self.interval_seconds)
+                self._watcher.start()
+            # The source may have changed while nothing was running.
+            self.notify_write()
         self._thread = threading.Thread(
-            target=self._backup_worker,
+            target=self._event_worker if self.trigger == self.EVENTS else self._backup_worker,
             name="Backup-Thread",
             daemon=True
         )
@@ -32,30 +122,333 @@ class BackupManager:
             return
         
         self._running = False
-        self._stop_event.set()
+        if self._watcher:
+            self._watcher.stop()
+            self._watcher = None
+        if self.storage is not None:
+            self.storage.remove_write_listener(self.notify_write)
+        with self._changed:
+            self._stop_event.set()
+            self._changed.notify_all()
         if self._thread:
             self._thread.join()
+
+    def notify_write(self, *_event) -> None:
+        """Report a write to the source; the event trigger backs it up after the debounce window."""
+        with self._changed:
+            now = time.monotonic()
+            if self._first_write is None:
+                self._first_write = now
+            self._last_write = now
+            self._changed.notify_all()
+
+    def _event_worker(self) -> None:
+        while True:
+            with self._changed:
+                while self._first_write is None and not self._stop_event.is_set():
+                    self._changed.wait()
+                if self._first_write is None:
+                    return
+                while not self._stop_event.is_set():
+                    due = min(self._last_write + self.debounce_seconds,
+                              self._first_write + self.max_staleness_seconds)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                self._first_write = None
+
+            self._run_backup()
     
     def _backup_worker(self) -> None:
-        while not self._stop_event.is_set():
-            for _ in range(self.interval_seconds):
-                if self._stop_event.is_set():
-                    return
-                time.sleep(1)
-            
-            if os.path.exists(self.source_file):
-                try:
-                    shutil.copy(self.source_file, self.backup_file)
-                except Exception as e:
-                    print(f"\n[BACKUP ERROR]: {e}")
+        while not self._stop_event.wait(self.interval_seconds):
+            self._run_backup()
+
+    def _run_backup(self) -> None:
+        if os.path.exists(self.source_file):
+            try:
+                self._copy()
+            except Exception as e:
+                print(f"\n[BACKUP ERROR]: {e}")
+
+        self._compact_storage()
+
+    def _compact_storage(self) -> None:
+        if self.storage is None:
+            return
+        try:
+            self.storage.compact_if_needed(self.compaction_threshold)
+        except Exception as e:
+            print(f"\n[COMPACTION ERROR]: {e}")
     
+    def verify_backup(self) -> bool:
+        """Check note by note that the backup holds the same notes as the source."""
+        if not os.path.exists(self.backup_file):
+            return False
+
+        source = self.storage or NoteStorage(self.source_file)
+        if not isinstance(source, (NoteStorage, ShardedNoteStorage)):
+            return self._same_notes(source.iter_notes(), type(source)(self.backup_file).iter_notes())
+        if not self._committed_delta_size():
+            return self._same_notes(source.iter_notes(), self._read_notes(self.backup_file))
+
+        fd, restored = tempfile.mkstemp(prefix=".verify-", dir=os.path.dirname(os.path.abspath(self.backup_file)))
+        os.close(fd)
+        try:
+            self.restore(restored)
+            return self._same_notes(source.iter_notes(), self._read_notes(restored))
+        finally:
+            os.remove(restored)
+
+    @staticmethod
+    def _read_notes(path: str) -> Iterator[Dict[str, object]]:
+        """Parse a notes file read-only, without the index and lock files ``NoteStorage`` would create."""
+        records, tail, _ = scan_blocks(path)
+        if tail is not None:
+            records.append(tail)
+        deleted = {r.target for r in records if isinstance(r, Tombstone)}
+        next_id = 1
+        with open(path, "rb") as f:
+            for record in records:
+                if isinstance(record, IdMark):
+                    next_id = max(next_id, record.next_id)
+                elif isinstance(record, IndexEntry):
+                    note_id = next_id if record.note_id is None else record.note_id
+                    next_id = max(next_id, note_id + 1)
+                    if record.offset in deleted:
+                        continue
+                    _, content, important = NoteStorage._parse_block(NoteStorage._read_block(f, record))
+                    yield {"id": note_id, "content": content, "important": important}
+
+    @staticmethod
+    def _same_notes(source_notes: Iterable[Dict[str, object]], backup_notes: Iterable[Dict[str, object]]) -> bool:
+        backup_notes = iter(backup_notes)
+        for expected in source_notes:
+            actual = next(backup_notes, None)
+            if actual is None or (actual["id"], actual["content"], actual["important"]) != (
+                    expected["id"], expected["content"], expected["important"]):
+                return False
+        return next(backup_notes, None) is None
+
+    def restore(self, target: Optional[str] = None) -> str:
+        """Rebuild the notes file (``target`` or the source) from the snapshot and its deltas."""
+        target = target or self.source_file
+        if os.path.isdir(target):
+            raise ValueError(f"{target} is a directory; restore to a file and import it with sharded_storage.py")
+        directory = os.path.dirname(os.path.abspath(target))
+        fd, tmp_path = tempfile.mkstemp(prefix=".restore-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                with open(self.backup_file, "rb") as src:
+                    shutil.copyfileobj(src, out)
+                delta_size = self._committed_delta_size()
+                if delta_size:
+                    with open(self.delta_file, "rb") as src:
+                        out.write(src.read(delta_size))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _discard_index(target)
+        return target
+
     def create_backup_now(self) -> bool:
         if not os.path.exists(self.source_file):
             return False
         
         try:
-            shutil.copy(self.source_file, self.backup_file)
+            self._copy()
             return True
         except Exception as e:
             print(f"\n[BACKUP ERROR]: {e}")
             return False
+
+    def _copy(self) -> str:
+        if self.storage is not None and not isinstance(self.storage, NoteStorage):
+            return self._copy_storage()
+
+        state = self._load_state()
+        lock = FileLock(self.source_file + ".lock")
+        with open(self.source_file, "rb") as src:
+            # The notes file is only ever appended to or replaced, so the first ``size`` bytes of the
+            # open file stay as they are once the lock is released; only the decision needs the lock.
+            with lock.shared():
+                st = os.fstat(src.fileno())
+                generation = lock.generation()
+                if state and (state["size"], state["mtime"]) == (st.st_size, st.st_mtime_ns) and \
+                        (state["identity"], state["generation"]) == ([st.st_dev, st.st_ino], generation):
+                    return self.SKIPPED
+                kind = self.DELTA if self._can_append(state, src, st, generation) else self.FULL
+            size = st.st_size
+
+            if kind == self.FULL:
+                self._write_snapshot(src, size)
+            else:
+                # Bytes past the committed length come from a run that crashed before saving its state.
+                with open(self.delta_file, "ab") as delta:
+                    delta.truncate(state["size"] - state["snapshot_size"])
+                    _copy_range(src, delta, state["size"], size)
+                    delta.flush()
+                    os.fsync(delta.fileno())
+
+            # Saving the state commits the run; restore ignores whatever it does not describe.
+            self._save_state({
+                "identity": [st.st_dev, st.st_ino],
+                "generation": generation,
+                "size": size,
+                "mtime": st.st_mtime_ns,
+                "tail_hash": self._tail_hash(src, size),
+                "snapshot_size": size if kind == self.FULL else state["snapshot_size"],
+                "snapshot_id": self._snapshot_id(),
+            })
+            self._snapshot_if_due(src, size)
+        return kind
+
+    def _snapshot_if_due(self, src, size: Optional[int] = None) -> None:
+        if self.snapshots is None:
+            return
+        latest = self.snapshots.latest()
+        if latest is not None:
+            age = datetime.now() - datetime.fromisoformat(latest["created"])
+            if age.total_seconds() < self.snapshot_interval_seconds:
+                return
+        self.snapshots.create(src, size=size)
+
+    def _can_append(self, state: Optional[Dict], src, st: os.stat_result, generation: int) -> bool:
+        if not state or not os.path.exists(self.backup_file):
+            return False
+        if state.get("snapshot_id") != self._snapshot_id():
+            return False
+        committed = state["size"] - state["snapshot_size"]
+        if committed and (not os.path.exists(self.delta_file) or os.path.getsize(self.delta_file) < committed):
+            return False
+        if (state["identity"], state["generation"]) != ([st.st_dev, st.st_ino], generation):
+            return False
+        if st.st_size < state["size"]:
+            return False
+        delta_size = st.st_size - state["snapshot_size"]
+        if delta_size > self.max_delta_ratio * max(state["snapshot_size"], self.TAIL_CHECK_BYTES):
+            return False
+        return self._tail_hash(src, state["size"]) == state["tail_hash"]
+
+    def _write_snapshot(self, src, size: int) -> None:
+        directory = os.path.dirname(os.path.abspath(self.backup_file))
+        fd, tmp_path = tempfile.mkstemp(prefix=".backup-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                _copy_range(src, out, 0, size)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.backup_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if os.path.exists(self.delta_file):
+            os.remove(self.delta_file)
+
+    def _tail_hash(self, src, end: int) -> str:
+        """Hash of the bytes just before ``end``, used to spot rewrites of already copied data."""
+        start = max(end - self.TAIL_CHECK_BYTES, 0)
+        src.seek(start)
+        digest = hashlib.sha256(src.read(end - start)).hexdigest()
+        src.seek(end)
+        return digest
+
+    def _copy_storage(self) -> str:
+        paths = self.storage.data_files()
+        signature = [[p, os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in paths]
+        state = self._load_state()
+        if state and state.get("signature") == signature and os.path.exists(self.backup_file):
+            return self.SKIPPED
+        self.storage.backup_to(self.backup_file)
+        self._save_state({"signature": signature})
+        with open(self.backup_file, "rb") as src:
+            self._snapshot_if_due(src)
+        return self.FULL
+
+    def _snapshot_id(self) -> Optional[list]:
+        try:
+            st = os.stat(self.backup_file)
+        except FileNotFoundError:
+            return None
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def _committed_delta_size(self) -> int:
+        """Delta bytes that belong to the current snapshot according to the saved state."""
+        state = self._load_state()
+        if not state or "snapshot_size" not in state or not os.path.exists(self.delta_file):
+            return 0
+        if state.get("snapshot_id") != self._snapshot_id():
+            # The snapshot was replaced after the state was saved; the delta is from the old one.
+            return 0
+        return state["size"] - state["snapshot_size"]
+
+    def _load_state(self) -> Optional[Dict]:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_state(self, state: Dict) -> None:
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_file)
+
+
+def _copy_range(src, out, start: int, end: int) -> None:
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(remaining, COPY_CHUNK_SIZE))
+        if not chunk:
+            break
+        out.write(chunk)
+        remaining -= len(chunk)
+
+
+def _discard_index(notes_file: str) -> None:
+    """Drop the sidecar index of a notes file that was just replaced, so the next reader rebuilds it."""
+    index_file = notes_file + ".idx"
+    if os.path.exists(index_file):
+        os.remove(index_file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List, verify and restore note backups.")
+    parser.add_argument("command", choices=["restore", "list", "verify"])
+    parser.add_argument("--backup", default="notes.bak", help="backup snapshot file")
+    parser.add_argument("--target", default="notes.txt", help="notes file to rebuild")
+    parser.add_argument("--generation", default=None, help="restore this generation instead of the latest backup")
+    args = parser.parse_args()
+
+    manager = BackupManager(args.target, args.backup)
+    if args.command == "list":
+        for entry in manager.snapshots.list():
+            print(f"{entry['name']}  {entry['created']}  {entry['size']} bytes ({entry['stored_size']} stored)")
+    elif args.command == "verify":
+        bad = [e["name"] for e in manager.snapshots.list() if not manager.snapshots.verify(e["name"])]
+        for name in bad:
+            print(f"Checksum mismatch: {name}")
+        print("All generations verified." if not bad else f"{len(bad)} generation(s) failed verification.")
+    else:
+        lock = FileLock(args.target + ".lock")
+        with lock.exclusive():
+            if args.generation:
+                manager.snapshots.restore(args.generation, args.target)
+                _discard_index(args.target)
+            else:
+                manager.restore()
+            lock.bump_generation()
+        print(f"Restored {args.target} from {args.generation or args.backup}")
+
+
+if __name__ == "__main__":
+    main()
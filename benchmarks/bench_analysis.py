@@ -0,0 +1,47 @@
+"""
+Time bulk re-analysis of a synthetic notes.txt.
+
+Usage: python benchmarks/bench_analysis.py [--counts 100000 1000000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import write_corpus
+from bulk_analysis import bulk_analyze, np
+from note_storage import NoteStorage
+
+
+def run(count: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "notes.txt")
+        write_corpus(path, count)
+        NoteStorage(path).get_note_count()
+
+        for parser in NoteStorage.PARSERS:
+            started = time.perf_counter()
+            summary = bulk_analyze(NoteStorage(path, parser=parser), os.path.join(tmp_dir, "log.txt"), append=False)
+            elapsed = time.perf_counter() - started
+            print(f"{count:>9} notes  {parser:<6} {elapsed:7.3f}s  "
+                  f"({summary.notes / elapsed:,.0f} notes/s, {len(summary.per_day)} days, "
+                  f"numpy {'on' if np is not None else 'off'})")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == "__main__":
+    main()
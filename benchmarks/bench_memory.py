@@ -0,0 +1,67 @@
+"""
+Measure the memory held per note by the structured note representations.
+
+Usage: python benchmarks/bench_memory.py [--counts 100000 1000000]
+"""
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import write_corpus
+from note_storage import NoteStorage
+from note_table import Note, NoteTable
+
+
+def held_bytes(build) -> int:
+    """Bytes still allocated by the result of ``build()`` once it returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def run(count: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "notes.txt")
+        write_corpus(path, count)
+        storage = NoteStorage(path)
+        storage.get_note_count()
+
+        layouts = {
+            "list of dicts": lambda: list(storage.iter_notes()),
+            "list of Note": lambda: [Note.from_mapping(n) for n in storage.iter_notes()],
+            "NoteTable": lambda: NoteTable(storage.iter_notes()),
+        }
+        print(f"{count:>9} notes")
+        base = None
+        for name, build in layouts.items():
+            per_note = held_bytes(build) / count
+            base = base or per_note
+            print(f"          {name:<14} {per_note:8.1f} bytes/note  ({per_note / base:.0%} of the dicts)")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == "__main__":
+    main()
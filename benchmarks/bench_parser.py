@@ -0,0 +1,58 @@
+"""
+Compare the line-based and the memory-mapped notes.txt parsers.
+
+Usage: python benchmarks/bench_parser.py [--counts 100000 1000000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import write_corpus
+from note_storage import NoteStorage
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def run(count: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "notes.txt")
+        write_corpus(path, count)
+        index_time = timed(lambda: NoteStorage(path).get_note_count())
+
+        results = {}
+        for parser in NoteStorage.PARSERS:
+            storage = NoteStorage(path, parser=parser)
+            storage.get_note_count()
+            load = timed(storage.get_notes_structured)
+            touch = timed(lambda: [n["content"] for n in storage.iter_notes()])
+            results[parser] = (load, touch)
+
+        print(f"{count:>9} notes  index build {index_time:7.3f}s")
+        for parser, (load, touch) in results.items():
+            print(f"          {parser:<6} load {load:7.3f}s  load+content {touch:7.3f}s")
+        base = results["lines"][1]
+        print(f"          speedup (load+content) {base / results['mmap'][1]:.2f}x")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for count in args.counts:
+        run(count)
+
+
+if __name__ == "__main__":
+    main()
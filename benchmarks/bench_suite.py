@@ -0,0 +1,217 @@
+"""
+Measure how storage, analysis, backups and calendar grouping scale, as JSON.
+
+Each corpus size gets a fresh synthetic notes.txt (see ``corpus.py``).
+The report goes to ``--output`` (stdout by default); with ``--compare``
+every metric is also checked against an earlier report and the run fails
+if one got worse by more than ``--tolerance``.
+
+Usage: python benchmarks/bench_suite.py [--counts 1000 10000 100000 1000000] [--output report.json]
+                                        [--compare baseline.json] [--tolerance 0.1]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import DISTRIBUTIONS, write_corpus
+from backup_manager import BackupManager
+from date_index import DateIndex
+from note_analyzer import NoteAnalyzer
+from note_storage import NoteStorage
+
+ADD_SAMPLE = 2000
+DELETE_SAMPLE = 200
+ANALYZER_SAMPLE = 20000
+BACKUP_APPEND = 100
+
+
+def timed(fn: Callable) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def fresh_copy(src: str, dst: str) -> NoteStorage:
+    """Copy the corpus without its index, so the first access builds it."""
+    shutil.copy(src, dst)
+    return NoteStorage(dst)
+
+
+def bench_load(corpus: str, work_dir: str) -> Dict[str, float]:
+    path = os.path.join(work_dir, "load.txt")
+    metrics = {"index_build_s": timed(fresh_copy(corpus, path).get_note_count)}
+    for parser in NoteStorage.PARSERS:
+        storage = NoteStorage(path, parser=parser)
+        storage.get_note_count()
+        metrics[f"structured_{parser}_s"] = timed(storage.get_notes_structured)
+    metrics["blocks_s"] = timed(NoteStorage(path).read_notes_as_blocks)
+    return metrics
+
+
+def bench_writes(corpus: str, work_dir: str, count: int, seed: int) -> Dict[str, float]:
+    storage = fresh_copy(corpus, os.path.join(work_dir, "writes.txt"))
+    storage.get_note_count()
+    sample = min(count, ADD_SAMPLE)
+
+    single = timed(lambda: [storage.add_note(f"benchmark note {i}", i % 5 == 0) for i in range(sample)])
+    batch = timed(lambda: storage.add_notes((f"batched note {i}", False) for i in range(sample)))
+
+    rng = random.Random(seed)
+    latencies = []
+    for note_id in rng.sample(range(1, count + 1), min(count, DELETE_SAMPLE)):
+        latencies.append(timed(lambda: storage.delete_note_by_id(note_id)) * 1000)
+    return {
+        "add_per_s": sample / single,
+        "add_batch_per_s": sample / batch,
+        "delete_p50_ms": percentile(latencies, 0.5),
+        "delete_p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def bench_analyzer(corpus: str, work_dir: str) -> Dict[str, float]:
+    analyzer = NoteAnalyzer(os.path.join(work_dir, "analysis_log.txt"), analysis_seconds=0)
+    notes = list(NoteStorage(corpus).iter_notes())[:ANALYZER_SAMPLE]
+    for note in notes:
+        analyzer.analyze_note(note["content"], note["important"], note["id"])
+
+    def drain() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer.start()
+            analyzer.stop()
+
+    return {"analyzer_drain_per_s": len(notes) / timed(drain)}
+
+
+def bench_backup(corpus: str, work_dir: str) -> Dict[str, float]:
+    storage = fresh_copy(corpus, os.path.join(work_dir, "backup.txt"))
+    storage.get_note_count()
+    manager = BackupManager(storage.filename, os.path.join(work_dir, "backup.bak"), storage=storage,
+                            snapshot_interval_seconds=None, trigger=BackupManager.INTERVAL)
+    full = timed(manager.create_backup_now)
+    storage.add_notes((f"after backup {i}", False) for i in range(BACKUP_APPEND))
+    delta = timed(manager.create_backup_now)
+    return {"backup_full_s": full, "backup_delta_s": delta}
+
+
+def bench_calendar(corpus: str) -> Dict[str, float]:
+    storage = NoteStorage(corpus)
+    notes = storage.get_notes_structured()
+    holder = {}
+    group = timed(lambda: holder.setdefault("index", DateIndex(notes)))
+    months = sorted({(n.datetime.year, n.datetime.month) for n in notes if n.datetime})[:12]
+    lookup = timed(lambda: [holder["index"].month(year, month) for year, month in months])
+    return {"month_grouping_s": group, "month_lookup_ms": lookup * 1000 / max(len(months), 1)}
+
+
+def run(count: int, args: argparse.Namespace) -> Dict[str, object]:
+    work_dir = tempfile.mkdtemp()
+    try:
+        corpus = os.path.join(work_dir, "corpus.txt")
+        write_corpus(corpus, count, args.seed, args.min_words, args.max_words, args.distribution,
+                     args.span_days, args.important)
+        metrics: Dict[str, float] = {}
+        metrics.update(bench_load(corpus, work_dir))
+        metrics.update(bench_writes(corpus, work_dir, count, args.seed))
+        metrics.update(bench_analyzer(corpus, work_dir))
+        metrics.update(bench_backup(corpus, work_dir))
+        metrics.update(bench_calendar(corpus))
+        return {"notes": count, "metrics": {name: round(value, 6) for name, value in metrics.items()}}
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Metrics that got worse than ``baseline`` by more than ``tolerance`` (``*_per_s`` higher is better)."""
+    if report["corpus"] != baseline.get("corpus"):
+        print("Warning: the baseline was measured on a different corpus", file=sys.stderr)
+    regressions = []
+    old_runs = {run["notes"]: run["metrics"] for run in baseline["runs"]}
+    for run in report["runs"]:
+        old_metrics = old_runs.get(run["notes"], {})
+        for name, value in run["metrics"].items():
+            old = old_metrics.get(name)
+            if not old or not value:
+                continue
+            slowdown = old / value if name.endswith("_per_s") else value / old
+            marker = ""
+            if slowdown > 1 + tolerance:
+                regressions.append(f"{run['notes']}:{name}")
+                marker = "  REGRESSION"
+            print(f"{run['notes']:>9} {name:<24} {old:12.6g} -> {value:12.6g}  ({slowdown:.2f}x){marker}",
+                  file=sys.stderr)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-words", type=int, default=2)
+    parser.add_argument("--max-words", type=int, default=12)
+    parser.add_argument("--distribution", default="uniform", choices=DISTRIBUTIONS)
+    parser.add_argument("--span-days", type=float, default=None, help="spread the notes over this many days")
+    parser.add_argument("--important", type=float, default=0.2, help="share of important notes")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown before failing")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {
+            "seed": args.seed,
+            "min_words": args.min_words,
+            "max_words": args.max_words,
+            "distribution": args.distribution,
+            "span_days": args.span_days,
+            "important_ratio": args.important,
+        },
+        "runs": [run(count, args) for count in args.counts],
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
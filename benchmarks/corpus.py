@@ -0,0 +1,63 @@
+"""
+Write a deterministic synthetic notes.txt for benchmarks.
+
+Usage: python benchmarks/corpus.py notes.txt [--count 100000] [--seed 42] [--min-words 2] [--max-words 12]
+                                             [--distribution uniform|lognormal] [--span-days N] [--important 0.2]
+"""
+import argparse
+import math
+import random
+import time
+from typing import Optional
+
+WORDS = ["ukol", "nakup", "schuzka", "zavolat", "uvar", "veceri", "projekt", "skola", "termin", "poznamka"]
+DISTRIBUTIONS = ("uniform", "lognormal")
+
+
+def write_corpus(path: str, count: int, seed: int = 42, min_words: int = 2, max_words: int = 12,
+                 distribution: str = "uniform", span_days: Optional[float] = None,
+                 important_ratio: float = 0.2) -> None:
+    """
+    Write ``count`` notes with ids 1..count to ``path``; the same arguments always give the same file.
+
+    Note lengths are drawn between ``min_words`` and ``max_words`` words,
+    evenly or, with ``lognormal``, mostly short with a long tail. Notes
+    start on 2024-01-01 one minute apart, or spread evenly over
+    ``span_days`` days. ``important_ratio`` of them are marked important.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown length distribution: {distribution}")
+    rng = random.Random(seed)
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    step = 60.0 if span_days is None else span_days * 86400 / max(count, 1)
+    median = math.sqrt(min_words * max_words)
+    with open(path, "w", encoding="utf-8") as f:
+        for note_id in range(1, count + 1):
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start + note_id * step))
+            if distribution == "uniform":
+                words = rng.randint(min_words, max_words)
+            else:
+                words = min(max(round(rng.lognormvariate(math.log(median), 0.6)), min_words), max_words)
+            content = " ".join(rng.choice(WORDS) for _ in range(words))
+            important = rng.random() < important_ratio
+            f.write(f"# Id: {note_id}\n# Date: {ts}\n# Note: {content}\n# Important: {important}\n"
+                    "# ----------------------------------\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-words", type=int, default=2)
+    parser.add_argument("--max-words", type=int, default=12)
+    parser.add_argument("--distribution", default="uniform", choices=DISTRIBUTIONS)
+    parser.add_argument("--span-days", type=float, default=None, help="spread the notes over this many days")
+    parser.add_argument("--important", type=float, default=0.2, help="share of important notes")
+    args = parser.parse_args()
+    write_corpus(args.path, args.count, args.seed, args.min_words, args.max_words, args.distribution,
+                 args.span_days, args.important)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Re-analyse every stored note in one pass.
+
+Notes are streamed from a storage backend in chunks (from each month file
+in parallel worker processes for sharded storage); word counts and the
+importance flags of a chunk are held in arrays, per-day totals are summed
+over the whole chunk at once (with NumPy when it is installed, plain
+``array`` otherwise), and each chunk's log records are written with a
+single ``write``.
+
+Usage: python bulk_analysis.py [--log analysis_log.txt] [--format text|jsonl]
+"""
+import argparse
+from array import array
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from analysis_log import AnalysisLogWriter
+from analysis_store import AnalysisStore
+from storage_backend import StorageBackend, open_storage
+
+
+class DayStats(NamedTuple):
+    notes: int
+    words: int
+    important: int
+
+
+class BulkSummary(NamedTuple):
+    notes: int
+    words: int
+    important: int
+    per_day: Dict[date, DayStats]
+
+
+def bulk_analyze(storage: StorageBackend, log_file: Optional[str] = None, log_format: str = AnalysisLogWriter.TEXT,
+                 append: bool = True, chunk_size: int = 65536, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, results: Optional[AnalysisStore] = None) -> BulkSummary:
+    """
+    Analyse the notes in ``storage`` and return totals and per-day stats.
+
+    With ``log_file`` a record per note is written in ``log_format``,
+    appended or, with ``append=False``, replacing the old log. Notes
+    without a date count towards the totals but not towards ``per_day``.
+    With ``results`` each note's word count and priority is stored by id.
+    """
+    analyzed_at = datetime.now().isoformat(timespec="seconds")
+    per_day: Dict[int, List[int]] = {}
+    totals = [0, 0, 0]
+
+    log = open(log_file, "a" if append else "w", encoding="utf-8") if log_file else None
+    try:
+        partitions = storage.scan_partitions(_analyze_chunks, chunk_size, analyzed_at, log_format if log else None,
+                                             since=since, until=until)
+        for chunks in partitions:
+            for ids, words, flags, days, text in chunks:
+                _add_day_totals(per_day, days, words, flags)
+                totals[0] += len(ids)
+                totals[1] += sum(words)
+                totals[2] += sum(flags)
+
+                if results is not None:
+                    results.put_many(
+                        (note_id, {"words": count, "important": flag})
+                        for note_id, count, flag in zip(ids, words, flags)
+                    )
+                if log:
+                    log.write(text)
+    finally:
+        if log:
+            log.close()
+
+    return BulkSummary(
+        totals[0], totals[1], totals[2],
+        {date.fromordinal(day): DayStats(*stats) for day, stats in sorted(per_day.items()) if day},
+    )
+
+
+def _analyze_chunks(storage: StorageBackend, since: Optional[datetime], until: Optional[datetime], chunk_size: int,
+                    analyzed_at: str, log_format: Optional[str]) -> Iterator[Tuple[array, array, array, array, str]]:
+    """
+    Yield ``(ids, words, flags, days, log_text)`` arrays for each chunk of notes.
+
+    Runs in a worker process for sharded storage, so only the arrays and
+    the formatted log text travel back, not the notes.
+    """
+    formatter = AnalysisLogWriter("", log_format or AnalysisLogWriter.TEXT)
+    for chunk in _chunks(storage.iter_notes(since=since, until=until), chunk_size):
+        contents = [note["content"] for note in chunk]
+        ids = array("q", [note["id"] for note in chunk])
+        words = array("q", [len(content.split()) for content in contents])
+        flags = array("b", [bool(note["important"]) for note in chunk])
+        days = array("q", [note["datetime"].toordinal() if note["datetime"] else 0 for note in chunk])
+        text = ""
+        if log_format:
+            text = "".join(
+                formatter.format({
+                    "analyzed_at": analyzed_at,
+                    "preview": content[:10],
+                    "words": count,
+                    "important": bool(flag),
+                    "priority": "URGENT" if flag else "Normal",
+                })
+                for content, count, flag in zip(contents, words, flags)
+            )
+        yield ids, words, flags, days, text
+
+
+def _chunks(notes: Iterable, size: int) -> Iterable[list]:
+    chunk = []
+    for note in notes:
+        chunk.append(note)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _add_day_totals(per_day: Dict[int, List[int]], days: array, words: array, flags: array) -> None:
+    if np is not None:
+        day_arr = np.frombuffer(days, dtype=np.int64)
+        unique, inverse = np.unique(day_arr, return_inverse=True)
+        notes = np.bincount(inverse)
+        word_sums = np.bincount(inverse, weights=np.frombuffer(words, dtype=np.int64))
+        imp_sums = np.bincount(inverse, weights=np.frombuffer(flags, dtype=np.int8))
+        rows = zip(unique.tolist(), notes.tolist(), word_sums.astype(np.int64).tolist(),
+                   imp_sums.astype(np.int64).tolist())
+    else:
+        chunk_totals: Dict[int, List[int]] = {}
+        for day, count, flag in zip(days, words, flags):
+            stats = chunk_totals.get(day)
+            if stats is None:
+                chunk_totals[day] = [1, count, flag]
+            else:
+                stats[0] += 1
+                stats[1] += count
+                stats[2] += flag
+        rows = ((day, n, w, i) for day, (n, w, i) in chunk_totals.items())
+
+    for day, notes_n, words_n, imp_n in rows:
+        stats = per_day.setdefault(day, [0, 0, 0])
+        stats[0] += notes_n
+        stats[1] += words_n
+        stats[2] += imp_n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-analyse all stored notes.")
+    parser.add_argument("--backend", default=None, help="storage backend (text, sqlite or sharded)")
+    parser.add_argument("--log", default="analysis_log.txt", help="analysis log to write")
+    parser.add_argument("--format", default=AnalysisLogWriter.TEXT, choices=AnalysisLogWriter.FORMATS)
+    parser.add_argument("--replace", action="store_true", help="replace the log instead of appending")
+    args = parser.parse_args()
+
+    storage = open_storage(args.backend)
+    summary = bulk_analyze(storage, args.log, args.format, append=not args.replace,
+                           results=storage.analysis_results())
+    print(f"Analyzed {summary.notes} notes ({summary.words} words, {summary.important} important) "
+          f"over {len(summary.per_day)} days")
+
+
+if __name__ == "__main__":
+    main()
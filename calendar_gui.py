@@ -1,17 +1,41 @@
 import calendar
+import queue
 import tkinter as tk
+from concurrent.futures import Future, ThreadPoolExecutor
 from tkinter import ttk
 from datetime import datetime
-from note_storage import NoteStorage
+from typing import Callable, Optional
+from storage_backend import open_storage
+from date_index import DateIndex
+from job_journal import JobJournal
 from note_analyzer import NoteAnalyzer
 from backup_manager import BackupManager
+from search_index import SearchIndex
 
 
 class CalendarGUI:
-    def __init__(self):
-        self.storage = NoteStorage()
-        self.analyzer = NoteAnalyzer()
-        self.backup = BackupManager()
+    """
+    Month calendar for notes.
+
+    Storage calls run on a single background worker (so they keep their
+    order) and hand their results back through ``results``, which the Tk
+    main thread drains with ``root.after``; widgets are only touched from
+    the main thread. Only the notes of the months shown are loaded, each
+    the first time it is shown after a reload. Month navigation is
+    debounced so clicking ``<``/``>`` repeatedly renders only the month the
+    user stops on.
+    """
+
+    POLL_MS = 50
+    NAV_DEBOUNCE_MS = 150
+
+    def __init__(self, backend: Optional[str] = None):
+        self.storage = open_storage(backend)
+        self.analyzer = NoteAnalyzer(results=self.storage.analysis_results(),
+                                     journal=JobJournal(self.storage.filename + ".jobs"))
+        self.backup = BackupManager(self.storage.filename, storage=self.storage)
+        self.search_index = SearchIndex(self.storage)
+        self.search_query: Optional[str] = None
 
         self.analyzer.start()
         self.backup.start()
@@ -20,11 +44,20 @@ class CalendarGUI:
         self.year = now.year
         self.month = now.month
         self.selected_day = now.day
-        self.notes_cache = []
-        self.day_index_map = []
+        self.date_index = DateIndex()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CalendarIO")
+        self.results: queue.Queue = queue.Queue()
+        self.pending = 0
+        self._reload_seq = 0
+        self._poll_job = None
+        self._nav_job = None
+        self.day_id_map = []
+        self.day_rows = []
+        self.day_cells = []
+        self.cell_of_day = {}
 
         self.root = tk.Tk()
-        self.root.title("Note Calendar (notes.txt)")
+        self.root.title(f"Note Calendar ({self.storage.filename})")
         self.root.geometry("960x640")
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -33,6 +66,8 @@ class CalendarGUI:
         self._build_body()
         self.render_calendar()
         self.render_day_notes()
+        self._poll_job = self.root.after(self.POLL_MS, self._poll_results)
+        self.reload_notes()
 
     def _build_header(self) -> None:
         header = ttk.Frame(self.root)
@@ -52,6 +87,14 @@ class CalendarGUI:
         reload_btn = ttk.Button(header, text="Reload", command=self.reload_notes)
         reload_btn.pack(side=tk.RIGHT, padx=5)
 
+        search_btn = ttk.Button(header, text="Search", command=self.run_search)
+        search_btn.pack(side=tk.RIGHT, padx=5)
+
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(header, textvariable=self.search_var, width=28)
+        search_entry.pack(side=tk.RIGHT, padx=5)
+        search_entry.bind("<Return>", lambda _e: self.run_search())
+
     def _build_form(self) -> None:
         form = ttk.Frame(self.root)
         form.pack(fill=tk.X, pady=6, padx=10)
@@ -69,7 +112,11 @@ class CalendarGUI:
 
         self.status_var = tk.StringVar(value="")
         status_lbl = ttk.Label(form, textvariable=self.status_var, foreground="#0a5")
-        status_lbl.grid(row=2, column=0, columnspan=4, sticky="w")
+        status_lbl.grid(row=2, column=0, columnspan=3, sticky="w")
+
+        self.loading_var = tk.StringVar(value="")
+        loading_lbl = ttk.Label(form, textvariable=self.loading_var, foreground="#888")
+        loading_lbl.grid(row=2, column=3, sticky="e")
 
         for c in range(4):
             form.columnconfigure(c, weight=1)
@@ -80,6 +127,7 @@ class CalendarGUI:
 
         self.calendar_frame = ttk.Frame(body)
         self.calendar_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 8))
+        self._build_calendar_grid()
 
         right = ttk.Frame(body)
         right.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
@@ -88,16 +136,109 @@ class CalendarGUI:
         day_lbl = ttk.Label(right, textvariable=self.day_label_var, font=("Segoe UI", 12, "bold"))
         day_lbl.pack(anchor="w")
 
+        filter_row = ttk.Frame(right)
+        filter_row.pack(fill=tk.X)
+        ttk.Label(filter_row, text="Min words:").pack(side=tk.LEFT)
+        self.min_words_var = tk.IntVar(value=0)
+        min_words = ttk.Spinbox(filter_row, from_=0, to=999, width=5, textvariable=self.min_words_var,
+                                command=self.render_day_notes)
+        min_words.pack(side=tk.LEFT, padx=5)
+        min_words.bind("<Return>", lambda _e: self.render_day_notes())
+
         self.listbox = tk.Listbox(right, height=20)
         self.listbox.pack(fill=tk.BOTH, expand=True, pady=5)
 
         delete_btn = ttk.Button(right, text="Delete selected note", command=self.delete_selected)
         delete_btn.pack(anchor="e")
 
+    def _build_calendar_grid(self) -> None:
+        for col, name in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]):
+            lbl = ttk.Label(self.calendar_frame, text=name, anchor="center", padding=4)
+            lbl.grid(row=0, column=col, sticky="nsew")
+
+        for pos in range(6 * 7):
+            frame = ttk.Frame(self.calendar_frame, borderwidth=1, relief="solid", padding=4)
+            frame.grid(row=1 + pos // 7, column=pos % 7, sticky="nsew", padx=2, pady=2)
+            btn = ttk.Button(frame, command=lambda p=pos: self.select_day(self.day_cells[p]["day"]))
+            btn.pack(anchor="nw")
+            labels = [ttk.Label(frame, anchor="w", wraplength=140, justify=tk.LEFT) for _ in range(3)]
+            self.day_cells.append({"frame": frame, "button": btn, "labels": labels, "shown": 0, "day": None})
+
+        for r in range(7):
+            self.calendar_frame.rowconfigure(r, weight=1)
+        for c in range(7):
+            self.calendar_frame.columnconfigure(c, weight=1)
+
+    def run_in_background(self, func: Callable, on_done: Callable[[Future], None]) -> None:
+        """Run ``func`` on the storage worker and call ``on_done(future)`` on the Tk thread."""
+        self.pending += 1
+        self.loading_var.set("Loading...")
+        future = self.executor.submit(func)
+        future.add_done_callback(lambda f: self.results.put((on_done, f)))
+
+    def _poll_results(self) -> None:
+        while True:
+            try:
+                on_done, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            try:
+                on_done(future)
+            except Exception as e:
+                self.status_var.set(f"Error: {e}")
+        if not self.pending:
+            self.loading_var.set("")
+        self._poll_job = self.root.after(self.POLL_MS, self._poll_results)
+
     def reload_notes(self) -> None:
+        self._reload_seq += 1
+        seq = self._reload_seq
+
+        year, month = self.year, self.month
+
+        def load() -> list:
+            self.storage.analysis_results().refresh()
+            if self.search_index.built:
+                self.search_index.build()
+            return self._month_notes(year, month)
+
+        def done(future: Future) -> None:
+            if seq != self._reload_seq:
+                return
+            self.date_index = DateIndex()
+            self.date_index.set_month(year, month, future.result())
+            self.show_month()
+            self.status_var.set(f"Reloaded from {self.storage.filename}")
+
+        self.run_in_background(load, done)
+
+    def load_month(self, year: int, month: int) -> None:
+        seq = self._reload_seq
+
+        def done(future: Future) -> None:
+            if seq != self._reload_seq:
+                return
+            self.date_index.set_month(year, month, future.result())
+            if (year, month) == (self.year, self.month):
+                self.refresh_views()
+
+        self.run_in_background(lambda: self._month_notes(year, month), done)
+
+    def _month_notes(self, year: int, month: int) -> list:
+        last_day = calendar.monthrange(year, month)[1]
+        return list(self.storage.iter_notes(since=datetime(year, month, 1),
+                                            until=datetime(year, month, last_day, 23, 59, 59)))
+
+    def refresh_views(self) -> None:
         self.render_calendar()
         self.render_day_notes()
-        self.status_var.set("Reloaded from notes.txt")
+
+    def show_month(self) -> None:
+        """Render the current month, loading its notes first if they are not loaded yet."""
+        self.refresh_views()
+        if not self.date_index.has_month(self.year, self.month):
+            self.load_month(self.year, self.month)
 
     def add_note(self) -> None:
         content = self.note_text.get("1.0", tk.END).strip()
@@ -107,17 +248,26 @@ class CalendarGUI:
 
         important = self.important_var.get()
 
-        try:
-            self.storage.add_note(content, important)
-            self.analyzer.analyze_note(content, important)
-        except ValueError as exc:
-            self.status_var.set(str(exc))
-            return
-
-        self.status_var.set("Note saved to notes.txt")
-        self.note_text.delete("1.0", tk.END)
-        self.important_var.set(False)
-        self.reload_notes()
+        def save():
+            return self.storage.get_note(self.storage.add_note(content, important))
+
+        def done(future: Future) -> None:
+            try:
+                note = future.result()
+            except ValueError as exc:
+                self.status_var.set(str(exc))
+                return
+            # Only clear the form once the note is stored, and only if it still holds what was saved.
+            if self.note_text.get("1.0", tk.END).strip() == content:
+                self.note_text.delete("1.0", tk.END)
+                self.important_var.set(False)
+            if note is not None:
+                self.analyzer.analyze_note(content, important, note["id"])
+                self.date_index.add(note)
+                self._refresh_note_day(note)
+            self.status_var.set(f"Note saved to {self.storage.filename}")
+
+        self.run_in_background(save, done)
 
     def delete_selected(self) -> None:
         selection = self.listbox.curselection()
@@ -126,98 +276,150 @@ class CalendarGUI:
             return
 
         idx_in_list = selection[0]
-        if idx_in_list >= len(self.day_index_map):
+        if idx_in_list >= len(self.day_id_map):
             self.status_var.set("Selection out of range.")
             return
 
-        note_index = self.day_index_map[idx_in_list]
-        success = self.storage.delete_note(note_index)
-        if success:
-            self.status_var.set("Note deleted.")
-            self.reload_notes()
-        else:
-            self.status_var.set("Could not delete note.")
+        note_id = self.day_id_map[idx_in_list]
+        if note_id is None:
+            self.status_var.set("Select a note to delete.")
+            return
 
-    def render_calendar(self) -> None:
-        for widget in self.calendar_frame.winfo_children():
-            widget.destroy()
+        def done(future: Future) -> None:
+            if future.result():
+                day = self.date_index.day_of(note_id)
+                self.date_index.remove(note_id)
+                if day is not None and day[:2] == (self.year, self.month):
+                    self.update_day_cell(day[2])
+                if self.search_query:
+                    self.run_search()
+                else:
+                    self.render_day_notes()
+                self.status_var.set("Note deleted.")
+            else:
+                self.status_var.set("Could not delete note.")
+
+        self.run_in_background(lambda: self.storage.delete_note_by_id(note_id), done)
 
+    def render_calendar(self) -> None:
         self.title_var.set(f"{calendar.month_name[self.month]} {self.year}")
 
-        notes = self.storage.get_notes_structured()
-        self.notes_cache = notes
-        per_day = self._group_by_day(notes)
-
-        for col, name in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]):
-            lbl = ttk.Label(self.calendar_frame, text=name, anchor="center", padding=4)
-            lbl.grid(row=0, column=col, sticky="nsew")
-
         first_weekday, num_days = calendar.monthrange(self.year, self.month)
-        row = 1
-        col = (first_weekday + 6) % 7
-
-        for day in range(1, num_days + 1):
-            frame = ttk.Frame(self.calendar_frame, borderwidth=1, relief="solid", padding=4)
-            frame.grid(row=row, column=col, sticky="nsew", padx=2, pady=2)
-
-            btn = ttk.Button(frame, text=str(day), command=lambda d=day: self.select_day(d))
-            btn.pack(anchor="nw")
-
-            for note in per_day.get(day, [])[:3]:
-                preview = note.get("content", "")[:40]
-                imp = " !" if note.get("important") else ""
-                lbl = ttk.Label(frame, text=preview + imp, anchor="w", wraplength=140, justify=tk.LEFT)
-                lbl.pack(anchor="w")
-
-            col += 1
-            if col > 6:
-                col = 0
-                row += 1
-
-        for r in range(row + 1):
-            self.calendar_frame.rowconfigure(r, weight=1)
-        for c in range(7):
-            self.calendar_frame.columnconfigure(c, weight=1)
+        offset = (first_weekday + 6) % 7
+        self.cell_of_day = {day: offset + day - 1 for day in range(1, num_days + 1)}
+
+        for pos, cell in enumerate(self.day_cells):
+            day = pos - offset + 1
+            if 1 <= day <= num_days:
+                cell["day"] = day
+                cell["button"].configure(text=str(day))
+                cell["frame"].grid()
+                self.update_day_cell(day)
+            else:
+                cell["day"] = None
+                cell["frame"].grid_remove()
+
+    def update_day_cell(self, day: int) -> None:
+        pos = self.cell_of_day.get(day)
+        if pos is None:
+            return
+        cell = self.day_cells[pos]
+        notes = self.date_index.day(self.year, self.month, day)[:3]
+
+        for lbl, note in zip(cell["labels"], notes):
+            preview = note.get("content", "")[:40]
+            imp = " !" if note.get("important") else ""
+            lbl.configure(text=preview + imp)
+        for lbl in cell["labels"][len(notes):cell["shown"]]:
+            lbl.pack_forget()
+        for lbl in cell["labels"][cell["shown"]:len(notes)]:
+            lbl.pack(anchor="w")
+        cell["shown"] = len(notes)
+
+    def _refresh_note_day(self, note) -> None:
+        dt_val = note.get("datetime")
+        if not dt_val or (dt_val.year, dt_val.month) != (self.year, self.month):
+            return
+        self.update_day_cell(dt_val.day)
+        if dt_val.day == self.selected_day:
+            self.render_day_notes()
 
     def select_day(self, day: int) -> None:
         self.selected_day = day
         self.render_day_notes()
 
-    def render_day_notes(self) -> None:
-        self.listbox.delete(0, tk.END)
-        self.day_index_map = []
+    def run_search(self) -> None:
+        query = self.search_var.get().strip()
+        if not query:
+            self.render_day_notes()
+            return
 
-        notes = self.notes_cache or self.storage.get_notes_structured()
-        filtered = []
-        for note in notes:
-            dt_val = note.get("datetime")
-            if not dt_val:
-                continue
-            if dt_val.year == self.year and dt_val.month == self.month and dt_val.day == self.selected_day:
-                filtered.append(note)
+        def search():
+            hits = self.search_index.search(query, limit=100)
+            return [note for note in map(self.storage.get_note, (hit.note_id for hit in hits)) if note]
+
+        def done(future: Future) -> None:
+            if query != self.search_var.get().strip():
+                return
+            notes = future.result()
+            self.search_query = query
+            self.day_label_var.set(f"Search: {query} ({len(notes)} results)")
+            rows = []
+            for note in notes:
+                dt_val = note.get("datetime")
+                date_str = dt_val.strftime("%Y-%m-%d %H:%M") if dt_val else "----------"
+                imp = " [! ]" if note.get("important") else ""
+                rows.append((note["id"], f"{date_str}{imp} {note.get('content', '')}"))
+            if not rows:
+                rows.append((None, "No matching notes."))
+            self._patch_listbox(rows)
+
+        self.run_in_background(search, done)
 
+    def render_day_notes(self) -> None:
+        self.search_query = None
+        notes = self.date_index.day(self.year, self.month, self.selected_day)
         self.day_label_var.set(f"Notes on {self.year}-{self.month:02d}-{self.selected_day:02d}")
+        results = self.storage.analysis_results()
+        try:
+            min_words = self.min_words_var.get()
+        except tk.TclError:
+            min_words = 0
 
-        for note in filtered:
+        rows = []
+        for note in notes:
+            analysis = results.get(note.get("id"))
+            if min_words and (analysis is None or analysis["words"] < min_words):
+                continue
             dt_val = note.get("datetime")
             time_str = dt_val.strftime("%H:%M") if dt_val else "--:--"
             imp = " [! ]" if note.get("important") else ""
-            text = f"{time_str}{imp} {note.get('content', '')}"
-            self.listbox.insert(tk.END, text)
-            self.day_index_map.append(note.get("index"))
+            words = f" ({analysis['words']} w)" if analysis else ""
+            rows.append((note.get("id"), f"{time_str}{imp} {note.get('content', '')}{words}"))
 
-        if not filtered:
-            self.listbox.insert(tk.END, "No notes for this day.")
+        if not rows:
+            rows.append((None, "No notes for this day."))
 
-    def _group_by_day(self, notes):
-        grouped = {}
-        for note in notes:
-            dt_val = note.get("datetime")
-            if not dt_val:
-                continue
-            if dt_val.year == self.year and dt_val.month == self.month:
-                grouped.setdefault(dt_val.day, []).append(note)
-        return grouped
+        self._patch_listbox(rows)
+
+    def _patch_listbox(self, rows) -> None:
+        """Bring the listbox to ``rows`` by replacing only the range that differs."""
+        old = self.day_rows
+        prefix = 0
+        while prefix < min(len(old), len(rows)) and old[prefix] == rows[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(old), len(rows)) - prefix
+               and old[len(old) - 1 - suffix] == rows[len(rows) - 1 - suffix]):
+            suffix += 1
+
+        if len(old) - suffix > prefix:
+            self.listbox.delete(prefix, len(old) - suffix - 1)
+        for i, (_, text) in enumerate(rows[prefix:len(rows) - suffix]):
+            self.listbox.insert(prefix + i, text)
+
+        self.day_rows = rows
+        self.day_id_map = [note_id for note_id, _ in rows]
 
     def prev_month(self) -> None:
         if self.month == 1:
@@ -225,9 +427,7 @@ class CalendarGUI:
             self.year -= 1
         else:
             self.month -= 1
-        self.selected_day = 1
-        self.render_calendar()
-        self.render_day_notes()
+        self._schedule_month_render()
 
     def next_month(self) -> None:
         if self.month == 12:
@@ -235,13 +435,28 @@ class CalendarGUI:
             self.year += 1
         else:
             self.month += 1
+        self._schedule_month_render()
+
+    def _schedule_month_render(self) -> None:
         self.selected_day = 1
-        self.render_calendar()
-        self.render_day_notes()
+        self.title_var.set(f"{calendar.month_name[self.month]} {self.year}")
+        if self._nav_job is not None:
+            self.root.after_cancel(self._nav_job)
+        self._nav_job = self.root.after(self.NAV_DEBOUNCE_MS, self._render_month)
+
+    def _render_month(self) -> None:
+        self._nav_job = None
+        self.show_month()
 
     def on_close(self) -> None:
+        for job in (self._poll_job, self._nav_job):
+            if job is not None:
+                self.root.after_cancel(job)
+        self.executor.shutdown(wait=True)
+        self.search_index.close()
         self.analyzer.stop()
         self.backup.stop()
+        self.storage.close()
         self.root.destroy()
 
     def run(self) -> None:
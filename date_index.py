@@ -0,0 +1,95 @@
+from bisect import insort
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from note_table import NO_DATE, Note, NoteTable, from_epoch
+
+
+class DateIndex:
+    """
+    Notes grouped by calendar day for month and day views.
+
+    Notes are bucketed by ``(year, month)`` and then by day, each day kept
+    in time order, so looking up a month or a day does not depend on how
+    many notes exist in total. ``add``/``remove`` update a single bucket
+    and ``set_month`` replaces one month, so a view can load months as
+    they are shown. Notes without a parsable date are left out.
+
+    The notes themselves live in a ``NoteTable`` and the buckets hold its
+    row numbers; a ``NoteTable`` passed in is used as is, without building
+    a ``Note`` per row. ``month`` and ``day`` build ``Note`` records only
+    for the rows they return. Rows of removed notes stay in the table
+    until the index is rebuilt.
+    """
+
+    def __init__(self, notes: Iterable[Mapping] = ()):
+        self._months: Dict[Tuple[int, int], Dict[int, List[int]]] = {}
+        self._day_of_id: Dict[int, Tuple[int, int, int]] = {}
+        self._loaded: Set[Tuple[int, int]] = set()
+        if isinstance(notes, NoteTable):
+            self._table = notes
+            for row in range(len(notes)):
+                self._bucket(row).append(row)
+            for days in self._months.values():
+                for rows in days.values():
+                    rows.sort(key=self._sort_key)
+        else:
+            self._table = NoteTable()
+            for note in notes:
+                self.add(note)
+
+    def __len__(self) -> int:
+        return len(self._day_of_id)
+
+    def add(self, note: Mapping) -> None:
+        if not note.get("datetime"):
+            return
+        row = len(self._table)
+        self._table.append(note if "index" in note else dict(note, index=None))
+        insort(self._bucket(row), row, key=self._sort_key)
+
+    def remove(self, note_id: int) -> bool:
+        key = self._day_of_id.pop(note_id, None)
+        if key is None:
+            return False
+        year, month, day = key
+        days = self._months[(year, month)]
+        days[day] = [r for r in days[day] if self._table.ids[r] != note_id]
+        if not days[day]:
+            del days[day]
+            if not days:
+                del self._months[(year, month)]
+        return True
+
+    def set_month(self, year: int, month: int, notes: Iterable[Mapping]) -> None:
+        """Replace the notes of one month with ``notes``, which must all fall in that month."""
+        for rows in self._months.pop((year, month), {}).values():
+            for row in rows:
+                self._day_of_id.pop(self._table.ids[row], None)
+        for note in notes:
+            self.add(note)
+        self._loaded.add((year, month))
+
+    def has_month(self, year: int, month: int) -> bool:
+        """Whether ``set_month`` has loaded this month."""
+        return (year, month) in self._loaded
+
+    def day_of(self, note_id: int) -> Optional[Tuple[int, int, int]]:
+        return self._day_of_id.get(note_id)
+
+    def month(self, year: int, month: int) -> Dict[int, List[Note]]:
+        return {day: [self._table[r] for r in rows] for day, rows in self._months.get((year, month), {}).items()}
+
+    def day(self, year: int, month: int, day: int) -> List[Note]:
+        return [self._table[r] for r in self._months.get((year, month), {}).get(day, [])]
+
+    def _bucket(self, row: int) -> List[int]:
+        """The day list ``row`` belongs in, recording the note's day; dateless rows get a throwaway list."""
+        epoch = self._table.epochs[row]
+        if epoch == NO_DATE:
+            return []
+        dt_val = from_epoch(epoch)
+        self._day_of_id[self._table.ids[row]] = (dt_val.year, dt_val.month, dt_val.day)
+        return self._months.setdefault((dt_val.year, dt_val.month), {}).setdefault(dt_val.day, [])
+
+    def _sort_key(self, row: int) -> Tuple[int, int]:
+        return self._table.epochs[row], self._table.ids[row]
@@ -0,0 +1,109 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    Reader/writer lock shared by threads and processes through a lock file.
+
+    Between processes it uses ``fcntl.flock`` (shared for readers, exclusive
+    for writers); on Windows ``msvcrt.locking`` is used and every lock is
+    exclusive. Within a process the lock is re-entrant: a thread holding it
+    may take it again, and asking for ``exclusive`` while holding ``shared``
+    upgrades the lock until the outermost release.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._exclusive = False
+        self._fd = None
+
+    @contextmanager
+    def shared(self):
+        self.acquire(exclusive=False)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def exclusive(self):
+        self.acquire(exclusive=True)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, exclusive: bool) -> None:
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock_fd(exclusive)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                self._lock_fd(True)
+                self._exclusive = True
+        except BaseException:
+            if self._depth == 0 and self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._unlock_fd()
+            finally:
+                os.close(self._fd)
+                self._fd = None
+                self._exclusive = False
+        self._thread_lock.release()
+
+    def generation(self) -> int:
+        """
+        Change counter kept in the lock file; must be called with the lock held.
+
+        Writers bump it when they replace the protected file, which lets other
+        processes notice the change even if the new file reuses the old inode.
+        """
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        raw = os.read(self._fd, 8)
+        return int.from_bytes(raw, "little") if len(raw) == 8 else 0
+
+    def bump_generation(self) -> int:
+        generation = self.generation() + 1
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, generation.to_bytes(8, "little"))
+        return generation
+
+    def _lock_fd(self, exclusive: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        elif msvcrt is not None and self._depth == 0:
+            # msvcrt locks are always exclusive and not re-entrant, so an upgrade has nothing to do.
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_fd(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
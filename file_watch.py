@@ -0,0 +1,141 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Optional
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_inotify()
+
+
+def inotify_available() -> bool:
+    return _libc is not None
+
+
+class FileWatcher:
+    """
+    Calls ``callback()`` from a background thread whenever ``path`` changes.
+
+    On Linux the file's directory is watched with inotify (through ctypes,
+    so a replace by rename is seen too) and the thread sleeps until
+    something happens. Elsewhere, or if inotify cannot be set up, the file
+    is polled every ``poll_seconds``. ``uses_inotify`` tells which one is
+    in use.
+    """
+
+    def __init__(self, path: str, callback: Callable[[], None], poll_seconds: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_seconds = poll_seconds
+        self.uses_inotify = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify_fd = -1
+        self._wake_fds = None
+
+    def start(self) -> None:
+        if self._thread:
+            return
+
+        self._stop_event.clear()
+        self.uses_inotify = self._open_inotify()
+        self._thread = threading.Thread(
+            target=self._inotify_worker if self.uses_inotify else self._poll_worker,
+            name="FileWatch-Thread",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._thread:
+            return
+
+        self._stop_event.set()
+        if self._wake_fds:
+            os.write(self._wake_fds[1], b"x")
+        self._thread.join()
+        self._thread = None
+        if self.uses_inotify:
+            os.close(self._inotify_fd)
+            for fd in self._wake_fds:
+                os.close(fd)
+            self._inotify_fd = -1
+            self._wake_fds = None
+
+    def _open_inotify(self) -> bool:
+        if _libc is None:
+            return False
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        directory = os.path.dirname(self.path)
+        if _libc.inotify_add_watch(fd, directory.encode(), _WATCH_MASK) < 0:
+            os.close(fd)
+            return False
+        self._inotify_fd = fd
+        self._wake_fds = os.pipe()
+        return True
+
+    def _inotify_worker(self) -> None:
+        name = os.path.basename(self.path).encode()
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([self._inotify_fd, self._wake_fds[0]], [], [])
+            if self._wake_fds[0] in ready:
+                break
+            try:
+                data = os.read(self._inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            changed = False
+            pos = 0
+            while pos + _EVENT.size <= len(data):
+                _, _, _, length = _EVENT.unpack_from(data, pos)
+                event_name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                changed = changed or event_name == name
+                pos += _EVENT.size + length
+            if changed:
+                self._notify()
+
+    def _poll_worker(self) -> None:
+        last = self._signature()
+        while not self._stop_event.wait(self.poll_seconds):
+            current = self._signature()
+            if current != last:
+                last = current
+                self._notify()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _notify(self) -> None:
+        try:
+            self.callback()
+        except Exception as e:
+            print(f"\n[FILE WATCH ERROR]: {e}")
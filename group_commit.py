@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from storage_backend import StorageBackend
+
+
+class GroupCommitWriter:
+    """
+    Collects ``add_note`` calls from several threads into batched writes.
+
+    Durability policies:
+
+    - ``per_note``: every note is written (and optionally fsynced) on its own.
+    - ``interval``: notes arriving within ``interval_ms`` of the first
+      waiting one are written together, however many there are.
+    - ``count``: notes are written once ``batch_size`` are waiting, or
+      ``max_latency_ms`` after the first one at the latest, so a quiet
+      writer is not left pending.
+
+    ``submit`` returns a ``Future`` that resolves to the note id once the
+    batch containing it has been written, which is the per-note
+    acknowledgement.
+    """
+
+    PER_NOTE = "per_note"
+    INTERVAL = "interval"
+    COUNT = "count"
+    POLICIES = (PER_NOTE, INTERVAL, COUNT)
+
+    def __init__(self, storage: StorageBackend, policy: str = INTERVAL, interval_ms: int = 10,
+                 batch_size: int = 100, fsync: bool = False, max_latency_ms: int = 1000):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown durability policy: {policy}")
+        self.storage = storage
+        self.policy = policy
+        self.interval_ms = interval_ms
+        self.batch_size = 1 if policy == self.PER_NOTE else batch_size
+        self.fsync = fsync
+        self.max_latency_ms = max_latency_ms
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread = None
+        self._running = False
+
+    def start(self) -> None:
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._worker,
+            name="GroupCommit-Thread",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything still queued, then stop the writer thread."""
+        if not self._running:
+            return
+
+        self._running = False
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+
+    def submit(self, content: str, important: bool = False) -> Future:
+        if not content.strip():
+            raise ValueError("Cannot add empty note")
+        if not self._running:
+            raise RuntimeError("GroupCommitWriter is not running")
+
+        future: Future = Future()
+        self._queue.put((content, important, future))
+        return future
+
+    def add_note(self, content: str, important: bool = False) -> int:
+        """Submit a note and wait until it has been written."""
+        return self.submit(content, important).result()
+
+    def _worker(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            if self.policy == self.INTERVAL:
+                limit, wait_ms = float("inf"), self.interval_ms
+            else:
+                limit, wait_ms = self.batch_size, self.max_latency_ms
+            deadline = time.monotonic() + wait_ms / 1000
+            while len(batch) < limit:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+        self._drain()
+
+    def _drain(self) -> None:
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), max(self.batch_size, 1)):
+            self._commit(leftovers[start:start + self.batch_size])
+
+    def _commit(self, batch: List[Tuple[str, bool, Future]]) -> None:
+        try:
+            ids: List[Optional[int]] = self.storage.add_notes(
+                [(content, important) for content, important, _ in batch], fsync=self.fsync
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for note_id, (_, _, future) in zip(ids, batch):
+            future.set_result(note_id)
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+
+class JobJournal:
+    """
+    Append-only journal of queued analysis jobs, as JSON lines.
+
+    ``record`` writes an ``add`` line and returns the job's sequence number,
+    ``done`` writes a ``done`` line for it. Opening the journal replays it,
+    and the jobs that never got a ``done`` are handed out once by
+    ``take_recovered``. Once more than ``compact_after`` lines are
+    superseded and they outnumber the pending jobs, the journal is
+    rewritten atomically with only the pending ``add`` lines, so restart
+    cost follows the backlog rather than the history. With ``fsync`` each
+    line is forced to disk before returning.
+    """
+
+    def __init__(self, path: str, compact_after: int = 10000, fsync: bool = False):
+        self.path = path
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._pending: Dict[int, list] = {}
+        self._next_seq = 1
+        self._dead = 0
+        self._load()
+        self._recovered: List[Tuple[int, list]] = sorted(self._pending.items())
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write("\n")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, job: Sequence) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending[seq] = list(job)
+            self._write({"op": "add", "seq": seq, "job": list(job)})
+            return seq
+
+    def done(self, seq: int) -> None:
+        with self._lock:
+            if self._pending.pop(seq, None) is None:
+                return
+            self._write({"op": "done", "seq": seq})
+            # The add line and this done line are both superseded now.
+            self._dead += 2
+            if self._dead > self.compact_after and self._dead > len(self._pending):
+                self._compact()
+
+    def take_recovered(self) -> List[Tuple[int, list]]:
+        """Jobs left unfinished by a previous run, in the order they were queued; returned only once."""
+        with self._lock:
+            recovered = [(seq, job) for seq, job in self._recovered if seq in self._pending]
+            self._recovered = []
+            return recovered
+
+    def compact(self) -> None:
+        with self._lock:
+            self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line torn by a crash mid-write.
+                    continue
+                seq = entry["seq"]
+                self._next_seq = max(self._next_seq, seq + 1)
+                if entry["op"] == "add":
+                    self._pending[seq] = entry["job"]
+                elif self._pending.pop(seq, None) is not None:
+                    self._dead += 2
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _write(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _compact(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for seq, job in sorted(self._pending.items()):
+                out.write(json.dumps({"op": "add", "seq": seq, "job": job}) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._dead = 0
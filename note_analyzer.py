@@ -1,58 +1,339 @@
+import heapq
+import itertools
+import json
+import os
 import queue
 import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence
+
+from analysis_cache import AnalysisCache
+from analysis_log import AnalysisLogWriter
+from analysis_store import AnalysisStore
+from bulk_analysis import BulkSummary, bulk_analyze
+from job_journal import JobJournal
+
+
+def analyze(content: str, is_important: bool, seconds: float) -> Dict[str, object]:
+    """Analyse one note; module level so it can run in a worker process."""
+    time.sleep(seconds)
+
+    return {
+        "analyzed_at": datetime.now().isoformat(timespec="seconds"),
+        "preview": content[:10],
+        "words": len(content.split()),
+        "important": is_important,
+        "priority": "URGENT" if is_important else "Normal",
+    }
+
+
+class AnalysisJob(NamedTuple):
+    content: str
+    important: bool
+    note_id: Optional[int] = None
+    enqueued_at: float = 0.0
+    deadline_at: Optional[float] = None
+    journal_seq: Optional[int] = None
+
 
 class NoteAnalyzer:
+    """
+    Analyses queued notes on a pool of ``workers`` threads (or processes with
+    ``use_processes``) and writes the results through an ``AnalysisLogWriter``.
+    """
+
+    BLOCK = "block"
+    DROP = "drop"
+    SPILL = "spill"
+    OVERFLOW_POLICIES = (BLOCK, DROP, SPILL)
     
-    def __init__(self, log_file: str = "analysis_log.txt"):
+    def __init__(self, log_file: str = "analysis_log.txt", workers: int = 1, use_processes: bool = False,
+                 max_queue_size: int = 0, overflow: str = BLOCK, spill_file: Optional[str] = None,
+                 analysis_seconds: float = 2.0, log_format: str = AnalysisLogWriter.TEXT,
+                 log_batch_size: int = 50, log_interval_ms: int = 200, cache: Optional[AnalysisCache] = None,
+                 results: Optional[AnalysisStore] = None, urgent_boost_seconds: float = 30.0,
+                 latency_window: int = 10000, journal: Optional[JobJournal] = None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
         self.log_file = log_file
-        self.analysis_queue: queue.Queue = queue.Queue()
+        self.workers = workers
+        self.use_processes = use_processes
+        self.overflow = overflow
+        self.spill_file = spill_file or log_file + ".spill"
+        self.analysis_seconds = analysis_seconds
+        self.cache = cache
+        self.results = results
+        self.journal = journal
+        self.urgent_boost_seconds = urgent_boost_seconds
+        self.analysis_queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=max_queue_size)
         self.print_lock = threading.Lock()
-        self._thread: threading.Thread = None
+        self.log_writer = AnalysisLogWriter(log_file, log_format, log_batch_size, log_interval_ms,
+                                            on_flushed=self._jobs_logged if journal is not None else None)
+        self.dropped = 0
+        self.spilled = 0
+        self.missed_deadlines = 0
+        self._sequence = itertools.count()
+        self._latencies: Dict[str, Dict[str, Deque[float]]] = {
+            priority: {"wait": deque(maxlen=latency_window), "total": deque(maxlen=latency_window)}
+            for priority in ("URGENT", "Normal")
+        }
+        self._stats_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        # The journal holds every spilled job too, so a spill file left by the last run is redundant.
+        if journal is not None and os.path.exists(self.spill_file):
+            os.remove(self.spill_file)
+        self._spill_pending = self._count_spilled()
+        self._spill_read_pos = 0
+        self._recovered: Deque[AnalysisJob] = deque()
+        self._threads: List[threading.Thread] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
         self._running = False
     
     def start(self) -> None:
+        """
+        Start the workers. With a ``journal``, jobs a previous run left
+        unfinished are queued again as room frees up.
+        """
         if self._running:
             return
         
         self._running = True
-        self._thread = threading.Thread(
-            target=self._worker,
-            name="Analyzer-Thread",
-            daemon=True
-        )
-        self._thread.start()
+        self.log_writer.start()
+        if self.use_processes:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._threads = [
+            threading.Thread(
+                target=self._worker,
+                name=f"Analyzer-Thread-{n}" if self.workers > 1 else "Analyzer-Thread",
+                daemon=True
+            )
+            for n in range(1, self.workers + 1)
+        ]
+        for thread in self._threads:
+            thread.start()
+        if self.journal is not None:
+            self._recovered.extend(AnalysisJob(*job)._replace(journal_seq=seq)
+                                   for seq, job in self.journal.take_recovered())
+        self._refill_from_spill()
     
     def stop(self) -> None:
+        """Finish every queued and spilled note, then stop each worker with its own poison pill."""
         if not self._running:
             return
         
         self._running = False
-        self.analysis_queue.put(None)
-        if self._thread:
-            self._thread.join()
+        self.analysis_queue.join()
+        for _ in self._threads:
+            self.analysis_queue.put((float("inf"), next(self._sequence), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        self.log_writer.stop()
+        if self.journal is not None:
+            self.journal.compact()
+        if self.cache is not None:
+            try:
+                self.cache.save()
+            except Exception as e:
+                print(f"\n[ANALYZER ERROR]: {e}")
+    
+    def analyze_note(self, content: str, is_important: bool, note_id: Optional[int] = None,
+                     deadline_seconds: Optional[float] = None) -> bool:
+        """
+        Queue a note for analysis, optionally to be started within ``deadline_seconds``.
+        Returns False if it was dropped because the queue is full.
+
+        When the queue is full, ``overflow`` decides: ``block`` waits for room,
+        ``drop`` discards the note and ``spill`` appends it to ``spill_file``.
+        An important note, or one with a deadline, always goes into the queue,
+        dropping or spilling the least urgent queued note instead.
+        """
+        now = time.time()
+        item = AnalysisJob(content, is_important, note_id, now,
+                           None if deadline_seconds is None else now + deadline_seconds)
+        if self.journal is not None:
+            item = item._replace(journal_seq=self.journal.record(item))
+        if self.overflow == self.BLOCK:
+            self.analysis_queue.put(self._entry(item))
+            return True
+
+        with self._spill_lock:
+            entry = self._entry(item)
+            urgent = item.important or item.deadline_at is not None
+            # Once something is spilled, later normal notes follow it to keep the order.
+            if not self._spill_pending or urgent:
+                try:
+                    self.analysis_queue.put_nowait(entry)
+                    return True
+                except queue.Full:
+                    pass
+            if urgent:
+                # An urgent note takes the place of the least urgent queued one, which overflows instead.
+                item = self._evict_for(entry) or item
+            if self.overflow == self.DROP:
+                self.dropped += 1
+                if item.journal_seq is not None:
+                    self.journal.done(item.journal_seq)
+                return False
+            with open(self.spill_file, "a", encoding="utf-8") as spill:
+                spill.write(json.dumps(item) + "\n")
+            self._spill_pending += 1
+            self.spilled += 1
+            return True
+
+    def _evict_for(self, entry) -> Optional[AnalysisJob]:
+        """Swap ``entry`` for the lowest-priority queued job if it outranks it; returns the job taken out."""
+        q = self.analysis_queue
+        with q.mutex:
+            heap = q.queue
+            if not heap:
+                return None
+            worst = max(range(len(heap)), key=lambda i: heap[i][:2])
+            if heap[worst][2] is None or heap[worst][:2] <= entry[:2]:
+                return None
+            evicted = heap[worst][2]
+            heap[worst] = entry
+            heapq.heapify(heap)
+            return evicted
+
+    def backfill(self, storage, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 important_only: bool = False) -> int:
+        """Queue stored notes for analysis, streaming them from ``storage``. Returns the number queued."""
+        queued = 0
+        for note in storage.iter_notes(since=since, until=until, important_only=important_only):
+            self.analyze_note(note["content"], note["important"], note["id"])
+            queued += 1
+        return queued
     
-    def analyze_note(self, content: str, is_important: bool) -> None:
-        self.analysis_queue.put((content, is_important))
+    def reanalyze(self, storage, since: Optional[datetime] = None, until: Optional[datetime] = None) -> BulkSummary:
+        """Analyse every stored note in bulk, bypassing the queue; see ``bulk_analysis.bulk_analyze``."""
+        return bulk_analyze(storage, self.log_file, self.log_writer.fmt, since=since, until=until,
+                            results=self.results)
     
+    def latency_percentiles(self, percentiles: Sequence[float] = (50, 95, 99)) -> Dict[str, Dict[str, Dict[float, float]]]:
+        """
+        Percentiles in seconds of the recent jobs, as
+        ``{priority: {"wait" | "total": {percentile: seconds}}}``. ``wait``
+        is the time spent queued, ``total`` the time until the result was
+        handed to the log.
+        """
+        with self._stats_lock:
+            samples = {p: {k: sorted(v) for k, v in kinds.items()} for p, kinds in self._latencies.items()}
+        return {
+            priority: {
+                kind: {pct: values[min(len(values) - 1, int(len(values) * pct / 100))] for pct in percentiles}
+                for kind, values in kinds.items() if values
+            }
+            for priority, kinds in samples.items()
+        }
+
+    def _entry(self, job: AnalysisJob):
+        """Order jobs by queue time, ``urgent_boost_seconds`` earlier for important ones or before a deadline."""
+        key = job.enqueued_at - (self.urgent_boost_seconds if job.important else 0.0)
+        if job.deadline_at is not None:
+            key = min(key, job.deadline_at - self.urgent_boost_seconds)
+        return key, next(self._sequence), job
+
     def _worker(self) -> None:
         while True:
-            note_data = self.analysis_queue.get()
-            if note_data is None:
+            _, _, job = self.analysis_queue.get()
+            if job is None:
+                self.analysis_queue.task_done()
                 break
             
-            content, is_important = note_data
-            time.sleep(2)
-            
-            word_count = len(content.split())
-            status = "URGENT" if is_important else "Normal"
-            log_entry = f"Analyzed: '{content[:10]}...' | Words: {word_count} | Priority: {status}\n"
-            
-            with open(self.log_file, "a") as log_file:
-                log_file.write(log_entry)
-            
-            self._thread_safe_print(f"Note analyzed and saved to the log. (Words: {word_count})")
-            self.analysis_queue.task_done()
+            try:
+                self._refill_from_spill()
+            except Exception as e:
+                print(f"\n[ANALYZER ERROR]: {e}")
+
+            started = time.time()
+            try:
+                self._analyze(job.content, job.important, job.note_id, job.journal_seq)
+            except Exception as e:
+                # The job stays open in the journal and is retried on the next start.
+                print(f"\n[ANALYZER ERROR]: {e}")
+            finally:
+                self._record_latency(job, started, time.time())
+                self.analysis_queue.task_done()
+
+    def _jobs_logged(self, journal_seqs: List[int]) -> None:
+        """A job is only done for the journal once its log record is in the file."""
+        for seq in journal_seqs:
+            self.journal.done(seq)
+
+    def _record_latency(self, job: AnalysisJob, started: float, finished: float) -> None:
+        with self._stats_lock:
+            latencies = self._latencies["URGENT" if job.important else "Normal"]
+            latencies["wait"].append(started - job.enqueued_at)
+            latencies["total"].append(finished - job.enqueued_at)
+            if job.deadline_at is not None and started > job.deadline_at:
+                self.missed_deadlines += 1
+
+    def _analyze(self, content: str, is_important: bool, note_id: Optional[int],
+                 journal_seq: Optional[int] = None) -> None:
+        record = self.cache.get(content, is_important) if self.cache is not None else None
+        if record is not None:
+            record["analyzed_at"] = datetime.now().isoformat(timespec="seconds")
+        else:
+            if self._pool:
+                record = self._pool.submit(analyze, content, is_important, self.analysis_seconds).result()
+            else:
+                record = analyze(content, is_important, self.analysis_seconds)
+            # Only a fresh result restarts the TTL; hits just refresh the LRU order in get.
+            if self.cache is not None:
+                self.cache.put(content, is_important, record)
+
+        self.log_writer.write(record, journal_seq)
+        if self.results is not None and note_id is not None:
+            self.results.put(note_id, record)
+        self._thread_safe_print(f"Note analyzed, queued for the log. (Words: {record['words']})")
+
+    def _count_spilled(self) -> int:
+        """Notes left in the spill file by a previous run are picked up again; a torn last line is cut off."""
+        if not os.path.exists(self.spill_file):
+            return 0
+        with open(self.spill_file, "rb+") as spill:
+            data = spill.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                spill.truncate(complete)
+        return sum(1 for line in data[:complete].splitlines() if line.strip())
+
+    def _refill_from_spill(self) -> None:
+        """Move jobs recovered from the journal, then spilled notes, back into the queue while it has room."""
+        with self._spill_lock:
+            while self._recovered and not self.analysis_queue.full():
+                self.analysis_queue.put_nowait(self._entry(self._recovered.popleft()))
+            if not self._spill_pending:
+                return
+            with open(self.spill_file, "r", encoding="utf-8") as spill:
+                spill.seek(self._spill_read_pos)
+                while self._spill_pending and not self.analysis_queue.full():
+                    line = spill.readline()
+                    if not line:
+                        self._spill_pending = 0
+                        break
+                    if not line.strip():
+                        continue
+                    self._spill_pending -= 1
+                    try:
+                        job = AnalysisJob(*json.loads(line))
+                    except (TypeError, ValueError):
+                        print(f"\n[ANALYZER ERROR]: Skipping unreadable spilled note: {line.strip()[:40]}")
+                        continue
+                    self.analysis_queue.put_nowait(self._entry(job._replace(enqueued_at=job.enqueued_at or time.time())))
+                self._spill_read_pos = spill.tell()
+            if not self._spill_pending:
+                os.remove(self.spill_file)
+                self._spill_read_pos = 0
     
     def _thread_safe_print(self, message: str) -> None:
         with self.print_lock:
@@ -0,0 +1,384 @@
+import hashlib
+import os
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+SEPARATOR = "# ----------------------------------"
+ID_PREFIX = "# Id:"
+NEXT_ID_PREFIX = "# Next-Id:"
+DELETED_PREFIX = "# Deleted:"
+INDEX_VERSION = "v4"
+# Bytes hashed at most for the data file fingerprint in the sidecar header.
+FINGERPRINT_LIMIT = 1 << 16
+
+_SEPARATOR_BYTES = SEPARATOR.encode("ascii")
+_ID_PREFIX = ID_PREFIX.encode("ascii")
+_NEXT_ID_PREFIX = NEXT_ID_PREFIX.encode("ascii")
+_DATE_PREFIX = b"# Date:"
+_IMPORTANT_PREFIX = b"# Important:"
+_DELETED_PREFIX = DELETED_PREFIX.encode("ascii")
+
+
+class IndexEntry(NamedTuple):
+    note_id: Optional[int]
+    offset: int
+    length: int
+    timestamp: str
+    important: bool
+
+
+class Tombstone(NamedTuple):
+    offset: int
+    length: int
+    target: int
+
+
+class IdMark(NamedTuple):
+    offset: int
+    length: int
+    next_id: int
+
+
+Record = Union[IndexEntry, Tombstone, IdMark]
+
+
+class NoteIndex:
+    """
+    Sidecar offset index for a notes file.
+
+    The sidecar (``<notes file>.idx``) holds one tab separated record per
+    note: note id, byte offset, block length, timestamp and important flag,
+    plus a ``D`` record for every tombstone appended by a delete and an ``M``
+    record for the ``# Next-Id:`` mark written by compaction. It is
+    append-only while notes are appended or deleted and is rebuilt from the
+    notes file whenever it is missing, stale or does not match the data.
+    Its fixed-width header records the length and SHA-256 of the first
+    block of the notes file, so a notes file replaced from outside (e.g. by
+    a restore) is noticed even when its size happens to fit the index.
+
+    Blocks written before note ids existed have no ``# Id:`` line. They get
+    the next free id in file order when first indexed, which keeps the
+    assignment stable across rebuilds, and the id is written into the block
+    by the next compaction.
+    """
+
+    def __init__(self, data_file: str, index_file: Optional[str] = None):
+        self.data_file = data_file
+        self.index_file = index_file or data_file + ".idx"
+        self.entries: List[IndexEntry] = []
+        self.by_id: Dict[int, IndexEntry] = {}
+        self.deleted: Set[int] = set()
+        self.tombstones = 0
+        self.next_id = 1
+        self._id_at_offset: Dict[int, int] = {}
+        self._tail: Optional[IndexEntry] = None
+        self._covered = 0
+        self._index_pos = 0
+        self._identity = None
+
+    def live_entries(self) -> List[IndexEntry]:
+        """A new list of the live entries, unaffected by later appends."""
+        if self.deleted:
+            entries = [e for e in self.entries if e.offset not in self.deleted]
+        else:
+            entries = list(self.entries)
+        if self._tail is not None:
+            entries.append(self._tail)
+        return entries
+
+    def get(self, note_id: int) -> Optional[IndexEntry]:
+        entry = self.by_id.get(note_id)
+        if entry is None and self._tail is not None and self._tail.note_id == note_id:
+            return self._tail
+        return entry
+
+    def has_tail(self) -> bool:
+        return self._tail is not None
+
+    def live_count(self) -> int:
+        return len(self.by_id) + (self._tail is not None)
+
+    def dead_ratio(self) -> float:
+        """Share of records in the data file that compaction would drop."""
+        total = len(self.entries) + self.tombstones
+        if not total:
+            return 0.0
+        return (len(self.deleted) + self.tombstones) / total
+
+    def is_current(self, generation: int = 0) -> bool:
+        """True when the notes file has not changed since the last sync."""
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            return self._identity is None and not self.entries
+        return (st.st_dev, st.st_ino, generation) == self._identity and st.st_size == self._covered
+
+    def sync(self, generation: int = 0) -> None:
+        """
+        Bring the in-memory index up to date with the files on disk.
+
+        ``generation`` identifies the current version of a file that gets
+        replaced (see ``FileLock.generation``); a change forces a reload.
+        """
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            self._reset()
+            return
+
+        identity = (st.st_dev, st.st_ino, generation)
+        if identity != self._identity or st.st_size < self._covered:
+            self._load(st.st_size)
+            self._identity = identity
+        else:
+            self._read_index_tail()
+
+        if st.st_size > self._covered:
+            self._index_data_tail()
+
+    def rebuild(self, generation: int = 0) -> None:
+        self._reset()
+        if os.path.exists(self.data_file):
+            self._write_header()
+            self._index_data_tail()
+            st = os.stat(self.data_file)
+            self._identity = (st.st_dev, st.st_ino, generation)
+        elif os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def record(self, record: Record) -> None:
+        """Register a block that was just appended at the end of the data file."""
+        self.record_many([record])
+
+    def record_many(self, records: List[Record]) -> None:
+        """Register consecutive blocks that were just appended at the end of the data file."""
+        if not records:
+            return
+        if records[0].offset != self._covered or self._tail is not None:
+            self.sync()
+            return
+        records = [self._apply(record) for record in records]
+        self._append_records(records)
+
+    def _apply(self, record: Record) -> Record:
+        if isinstance(record, Tombstone):
+            if record.target not in self.deleted:
+                note_id = self._id_at_offset.get(record.target)
+                if note_id is not None:
+                    self.by_id.pop(note_id, None)
+                self.deleted.add(record.target)
+            self.tombstones += 1
+        elif isinstance(record, IdMark):
+            self.next_id = max(self.next_id, record.next_id)
+        else:
+            if record.note_id is None:
+                record = record._replace(note_id=self.next_id)
+            self.next_id = max(self.next_id, record.note_id + 1)
+            self.entries.append(record)
+            self.by_id[record.note_id] = record
+            self._id_at_offset[record.offset] = record.note_id
+        self._covered = record.offset + record.length
+        return record
+
+    def _reset(self) -> None:
+        self.entries = []
+        self.by_id = {}
+        self.deleted = set()
+        self.tombstones = 0
+        self.next_id = 1
+        self._id_at_offset = {}
+        self._tail = None
+        self._covered = 0
+        self._index_pos = 0
+        self._identity = None
+        self._fingerprint_length = 0
+
+    def _load(self, data_size: int) -> None:
+        self._reset()
+        if not os.path.exists(self.index_file):
+            self._write_header()
+            return
+
+        with open(self.index_file, "rb") as f:
+            header = f.readline().decode("ascii", "replace").split()
+            if len(header) != 5 or header[:3] != ["#", "notes-index", INDEX_VERSION] or not header[3].isdigit():
+                self._write_header()
+                return
+            self._index_pos = f.tell()
+        length = int(header[3])
+        if length and self._fingerprint(length) != (length, header[4]):
+            self._write_header()
+            return
+        self._fingerprint_length = length
+        self._read_index_tail()
+
+        if self._covered > data_size or not self._last_entry_matches():
+            self._reset()
+            self._write_header()
+
+    def _read_index_tail(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, "rb") as f:
+            f.seek(self._index_pos)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._index_pos += len(raw)
+                record = self._parse_record(raw)
+                if record is None or record.offset < self._covered:
+                    continue
+                self._apply(record)
+
+    def _last_entry_matches(self) -> bool:
+        if not self._covered:
+            return True
+        with open(self.data_file, "rb") as f:
+            f.seek(max(0, self._covered - len(_SEPARATOR_BYTES) - 2))
+            raw = f.read(len(_SEPARATOR_BYTES) + 2)
+        return raw.rstrip().endswith(_SEPARATOR_BYTES)
+
+    def _index_data_tail(self) -> None:
+        records, tail, covered = scan_blocks(self.data_file, self._covered)
+        if records:
+            records = [self._apply(record) for record in records]
+            self._append_records(records)
+        self._covered = covered
+        if tail is not None and tail.note_id is None:
+            tail = tail._replace(note_id=self.next_id)
+        self._tail = tail
+
+    def _write_header(self) -> None:
+        with open(self.index_file, "wb") as f:
+            f.write(self._header())
+            self._index_pos = f.tell()
+
+    def _header(self) -> bytes:
+        self._fingerprint_length, digest = self._fingerprint()
+        return f"# notes-index {INDEX_VERSION} {self._fingerprint_length:010d} {digest}\n".encode("ascii")
+
+    def _fingerprint(self, length: Optional[int] = None) -> Tuple[int, str]:
+        """``(length, sha256)`` of the data file's first ``length`` bytes, by default of its first complete block."""
+        try:
+            with open(self.data_file, "rb") as f:
+                if length is None:
+                    length = _first_block_length(f)
+                    f.seek(0)
+                data = f.read(length)
+        except FileNotFoundError:
+            data = b""
+        return len(data), hashlib.sha256(data).hexdigest()
+
+    def _append_records(self, records: List[Record]) -> None:
+        lines = []
+        for r in records:
+            if isinstance(r, Tombstone):
+                lines.append(f"D\t{r.offset}\t{r.length}\t{r.target}\n")
+            elif isinstance(r, IdMark):
+                lines.append(f"M\t{r.offset}\t{r.length}\t{r.next_id}\n")
+            else:
+                lines.append(f"N\t{r.note_id}\t{r.offset}\t{r.length}\t{r.timestamp}\t{int(r.important)}\n")
+        stale_header = None
+        with open(self.index_file, "ab") as f:
+            if not f.tell():
+                f.write(self._header())
+            elif not self._fingerprint_length:
+                # The header was written before the data file had a complete block; it has one now.
+                stale_header = self._header()
+            f.write("".join(lines).encode("utf-8"))
+            self._index_pos = f.tell()
+        if stale_header is not None:
+            with open(self.index_file, "r+b") as f:
+                f.write(stale_header)
+
+    @staticmethod
+    def _parse_record(raw: bytes) -> Optional[Record]:
+        parts = raw.decode("utf-8", "replace").rstrip("\n").split("\t")
+        try:
+            if parts[0] == "N" and len(parts) == 6:
+                return IndexEntry(int(parts[1]), int(parts[2]), int(parts[3]), parts[4], parts[5] == "1")
+            if parts[0] == "D" and len(parts) == 4:
+                return Tombstone(int(parts[1]), int(parts[2]), int(parts[3]))
+            if parts[0] == "M" and len(parts) == 4:
+                return IdMark(int(parts[1]), int(parts[2]), int(parts[3]))
+        except ValueError:
+            pass
+        return None
+
+
+def _first_block_length(f) -> int:
+    """Bytes up to the end of the first separator line, or 0 if there is none within ``FINGERPRINT_LIMIT``."""
+    length = 0
+    for line in f:
+        length += len(line)
+        if length > FINGERPRINT_LIMIT:
+            break
+        if line.strip() == _SEPARATOR_BYTES:
+            return length
+    return 0
+
+
+def _parse_int(value: bytes) -> Optional[int]:
+    try:
+        return int(value.strip())
+    except ValueError:
+        return None
+
+
+def scan_blocks(data_file: str, start: int = 0):
+    """
+    Scan ``data_file`` from byte ``start`` and return ``(records, tail, covered)``.
+
+    ``records`` are the complete (separator terminated) note, tombstone and
+    id mark blocks, ``tail`` is a trailing note block without a separator,
+    if any, and ``covered`` is the offset up to which the file was consumed
+    by complete blocks.
+    """
+    records: List[Record] = []
+    block_start = start
+    pos = start
+    note_id: Optional[int] = None
+    timestamp = ""
+    important = False
+    target: Optional[int] = None
+    next_id: Optional[int] = None
+    has_content = False
+
+    with open(data_file, "rb") as f:
+        f.seek(start)
+        for line in f:
+            pos += len(line)
+            stripped = line.strip()
+            if stripped.startswith(_SEPARATOR_BYTES):
+                if target is not None:
+                    records.append(Tombstone(block_start, pos - block_start, target))
+                elif next_id is not None:
+                    records.append(IdMark(block_start, pos - block_start, next_id))
+                elif has_content:
+                    records.append(IndexEntry(note_id, block_start, pos - block_start, timestamp, important))
+                block_start = pos
+                note_id = None
+                timestamp = ""
+                important = False
+                target = None
+                next_id = None
+                has_content = False
+                continue
+            if not stripped:
+                continue
+            has_content = True
+            if stripped.startswith(_ID_PREFIX):
+                note_id = _parse_int(stripped[len(_ID_PREFIX):])
+            elif stripped.startswith(_DATE_PREFIX):
+                timestamp = stripped[len(_DATE_PREFIX):].strip().decode("utf-8", "replace")
+            elif stripped.startswith(_IMPORTANT_PREFIX):
+                important = stripped[len(_IMPORTANT_PREFIX):].strip().lower() == b"true"
+            elif stripped.startswith(_DELETED_PREFIX):
+                target = _parse_int(stripped[len(_DELETED_PREFIX):])
+            elif stripped.startswith(_NEXT_ID_PREFIX):
+                next_id = _parse_int(stripped[len(_NEXT_ID_PREFIX):])
+
+    tail = None
+    if has_content and target is None and next_id is None:
+        tail = IndexEntry(note_id, block_start, pos - block_start, timestamp, important)
+    covered = block_start if has_content else pos
+    return records, tail, covered
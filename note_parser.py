@@ -0,0 +1,126 @@
+import mmap
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+from note_index import IndexEntry
+
+_DATE_PREFIX = b"# Date:"
+_NOTE_PREFIX = b"# Note:"
+_IMPORTANT_PREFIX = b"# Important:"
+_NEWLINE = 0x0A
+_DASH = 0x2D
+_COLON = 0x3A
+
+
+def parse_timestamp(raw: bytes) -> Optional[datetime]:
+    """Parse a fixed-width ``%Y-%m-%d %H:%M:%S`` timestamp by slicing instead of strptime."""
+    if (len(raw) != 19 or raw[4] != _DASH or raw[7] != _DASH
+            or raw[13] != _COLON or raw[16] != _COLON):
+        return None
+    try:
+        return datetime(int(raw[0:4]), int(raw[5:7]), int(raw[8:10]),
+                        int(raw[11:13]), int(raw[14:16]), int(raw[17:19]))
+    except ValueError:
+        return None
+
+
+class LazyNote(Mapping):
+    """
+    Parsed note whose content is decoded on first access.
+
+    Supports the same key access as the dicts from ``get_notes_structured``.
+    The note holds a copy of its content bytes, not the memory map, so the
+    map can be closed (and on Windows the file replaced) while notes are
+    still in use.
+    """
+
+    __slots__ = ("index", "id", "datetime", "important", "_raw", "_content")
+
+    _KEYS = ("index", "id", "datetime", "content", "important")
+
+    def __init__(self, index: int, note_id: Optional[int], dt_val: Optional[datetime], important: bool,
+                 raw: bytes):
+        self.index = index
+        self.id = note_id
+        self.datetime = dt_val
+        self.important = important
+        self._raw = raw
+        self._content: Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = self._raw.decode("utf-8", "replace").strip()
+            self._raw = None
+        return self._content
+
+    def __getitem__(self, key: str):
+        if key == "content":
+            return self.content
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"LazyNote({dict(self)!r})"
+
+
+def _find_field(buf, prefix: bytes, start: int, end: int) -> int:
+    pos = buf.find(prefix, start, end)
+    while pos > start and buf[pos - 1] != _NEWLINE:
+        pos = buf.find(prefix, pos + 1, end)
+    return pos
+
+
+def _line_end(buf, start: int, end: int) -> int:
+    pos = buf.find(b"\n", start, end)
+    return end if pos == -1 else pos
+
+
+def parse_block(buf, start: int, end: int) -> Tuple[Optional[datetime], int, int, bool]:
+    """
+    Locate the fields of the block ``buf[start:end]`` without copying it.
+
+    Returns ``(datetime, content_start, content_end, important)``.
+    """
+    dt_val = None
+    pos = _find_field(buf, _DATE_PREFIX, start, end)
+    if pos != -1:
+        value_start = pos + len(_DATE_PREFIX)
+        dt_val = parse_timestamp(buf[value_start:_line_end(buf, value_start, end)].strip())
+
+    content_start = content_end = start
+    fields_from = start
+    pos = _find_field(buf, _NOTE_PREFIX, start, end)
+    if pos != -1:
+        content_start = pos + len(_NOTE_PREFIX)
+        content_end = _line_end(buf, content_start, end)
+        fields_from = content_end
+
+    important = False
+    pos = _find_field(buf, _IMPORTANT_PREFIX, fields_from, end)
+    if pos != -1:
+        value_start = pos + len(_IMPORTANT_PREFIX)
+        important = buf[value_start:_line_end(buf, value_start, end)].strip().lower() == b"true"
+
+    return dt_val, content_start, content_end, important
+
+
+def iter_mmap_notes(f, entries: Iterable[Tuple[int, IndexEntry]]) -> Iterator[LazyNote]:
+    """
+    Yield a ``LazyNote`` for each ``(index, entry)`` pair, reading the open file ``f`` through a memory map.
+
+    The map is closed when the generator finishes or is closed.
+    """
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for idx, entry in entries:
+            end = entry.offset + entry.length
+            dt_val, content_start, content_end, important = parse_block(buf, entry.offset, end)
+            yield LazyNote(idx, entry.note_id, dt_val, important, buf[content_start:content_end])
@@ -1,93 +1,414 @@
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
+from file_lock import FileLock
+from note_index import NoteIndex, IndexEntry, IdMark, Tombstone, SEPARATOR, ID_PREFIX, NEXT_ID_PREFIX, DELETED_PREFIX
+from note_parser import iter_mmap_notes
+from storage_backend import StorageBackend
 
-class NoteStorage:
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+_TIMESTAMP_LENGTH = len("2000-01-01 00:00:00")
+
+
+def _full_timestamp(timestamp: str) -> str:
+    """
+    ``timestamp`` in ``DATE_FORMAT`` so it compares correctly as a string, or "" if it is not a date.
+
+    Older notes may carry a shorter ISO date such as ``2025-01-01``, which
+    counts as midnight of that day.
+    """
+    try:
+        return datetime.fromisoformat(timestamp).strftime(DATE_FORMAT)
+    except ValueError:
+        return ""
+
+
+def format_block(note_id: int, timestamp: str, content: str, important: bool) -> str:
+    """One note as a notes.txt block."""
+    return (
+        f"{ID_PREFIX} {note_id}\n# Date: {timestamp}\n# Note: {content}\n"
+        f"# Important: {important}\n{SEPARATOR}\n"
+    )
+
+
+def format_note(note: Mapping) -> str:
+    """An ``iter_notes`` mapping as a notes.txt block."""
+    timestamp = note["datetime"].strftime(DATE_FORMAT) if note["datetime"] else ""
+    return format_block(note["id"], timestamp, note["content"], note["important"])
+
+
+def write_notes_file(path: str, notes: Iterable[Mapping], next_id: int) -> int:
+    """
+    Write ``notes`` (``iter_notes`` mappings) to a notes.txt file atomically. Returns the number written.
+
+    The file starts with a ``# Next-Id:`` mark, so ids are not reused once
+    it is opened with ``NoteStorage``.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".notes-", suffix=".tmp", dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(f"{NEXT_ID_PREFIX} {next_id}\n{SEPARATOR}\n".encode("utf-8"))
+            for note in notes:
+                out.write(format_note(note).encode("utf-8"))
+                written += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+class NoteStorage(StorageBackend):
+
+    COMPACTION_THRESHOLD = 0.3
+    READ_CHUNK_SIZE = 1 << 20
+    PARSERS = ("lines", "mmap")
     
-    def __init__(self, filename: str = "notes.txt"):
+    def __init__(self, filename: str = "notes.txt", parser: str = "lines"):
+        if parser not in self.PARSERS:
+            raise ValueError(f"Unknown parser: {parser}")
         self.filename = filename
+        self.parser = parser
+        self._index = NoteIndex(filename)
+        self._lock = FileLock(filename + ".lock")
     
-    def add_note(self, content: str, important: bool = False) -> None:
-        if not content.strip():
-            raise ValueError("Cannot add empty note")
-        
+    def add_note(self, content: str, important: bool = False) -> int:
+        """Append a note and return its id."""
+        return self.add_notes([(content, important)])[0]
+
+    def add_notes(self, notes: Iterable[Tuple[str, bool]], fsync: bool = False) -> List[int]:
+        """
+        Append several ``(content, important)`` notes with a single write and return their ids.
+
+        Nothing is written if any of the notes is empty. With ``fsync`` the
+        data is forced to disk before returning.
+        """
         import time
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        
-        with open(self.filename, "a") as f:
-            f.write(f"# Date: {timestamp}\n# Note: {content}\n# Important: {important}\n# ----------------------------------\n")
+        ids = self._append_notes(list(notes), time.strftime(DATE_FORMAT, time.localtime()), fsync)
+        if ids:
+            self._notify_write("add", ids)
+        return ids
+
+    def _append_notes(self, notes: List[Tuple[str, bool]], timestamp: str, fsync: bool = False,
+                      min_id: int = 1) -> List[int]:
+        """Write ``notes`` stamped with ``timestamp``; ids start at ``min_id`` or later, never reused."""
+        if any(not content.strip() for content, _ in notes):
+            raise ValueError("Cannot add empty note")
+        if not notes:
+            return []
+
+        with self._lock.exclusive():
+            self._prepare_append()
+            first_id = max(self._index.next_id, min_id)
+            blocks = [
+                format_block(first_id + i, timestamp, content, important).encode("utf-8")
+                for i, (content, important) in enumerate(notes)
+            ]
+            # An id mark keeps the ids from falling back below ``min_id`` on a rebuild.
+            mark = b""
+            if first_id > self._index.next_id:
+                mark = f"{NEXT_ID_PREFIX} {first_id}\n{SEPARATOR}\n".encode("utf-8")
+            offset = self._write_raw(mark + b"".join(blocks), fsync=fsync)
+            records = [IdMark(offset, len(mark), first_id)] if mark else []
+            offset += len(mark)
+            for i, (block, (_, important)) in enumerate(zip(blocks, notes)):
+                records.append(IndexEntry(first_id + i, offset, len(block), timestamp, important))
+                offset += len(block)
+            self._index.record_many(records)
+        return [first_id + i for i in range(len(notes))]
     
     def read_notes_as_blocks(self) -> List[str]:
-        if not os.path.exists(self.filename):
-            return []
-        
-        with open(self.filename, 'r') as file:
-            content = file.read().strip()
-        
-        if not content:
+        entries, f = self._open_snapshot()
+        if f is None:
             return []
-        
-        raw_notes = content.split("# ----------------------------------")
-        notes = []
-        for n in raw_notes:
-            n = n.strip()
-            if n:
-                notes.append(n + "\n# ----------------------------------\n")
-        
-        return notes
+        with f:
+            return [self._decode_block(raw) for _, _, raw in self._iter_raw_blocks(f, enumerate(entries))]
+
+    def read_note_block(self, index: int) -> Optional[str]:
+        """Return a single note block with one seek, without loading the rest of the file."""
+        with self._reading():
+            entries = self._index.live_entries()
+            if not (0 <= index < len(entries)):
+                return None
+            with open(self.filename, "rb") as f:
+                return self._read_block(f, entries[index])
     
+    def get_note(self, note_id: int) -> Optional[Dict[str, object]]:
+        """Return a single note by id with one dictionary lookup and one seek."""
+        with self._reading():
+            entry = self._index.get(note_id)
+            if entry is None:
+                return None
+            with open(self.filename, "rb") as f:
+                block = self._read_block(f, entry)
+        dt_val, content, important = self._parse_block(block)
+        return {
+            "id": note_id,
+            "datetime": dt_val,
+            "content": content,
+            "important": important,
+        }
+
     def delete_note(self, index: int) -> bool:
-        notes = self.read_notes_as_blocks()
-        
-        if not (0 <= index < len(notes)):
-            return False
-        
-        del notes[index]
-        
-        with open(self.filename, 'w') as file:
-            for note in notes:
-                file.write(note)
-        
+        """
+        Delete the note at position ``index`` by appending a tombstone record.
+
+        The note block stays in the file until the next compaction. Prefer
+        ``delete_note_by_id`` when the position may have changed since the
+        notes were listed.
+        """
+        with self._lock.exclusive():
+            self._sync()
+            entries = self._index.live_entries()
+
+            if not (0 <= index < len(entries)):
+                return False
+
+            note_id = entries[index].note_id
+            self._append_tombstone(entries[index])
+
+        self._notify_write("delete", [note_id])
+        return True
+
+    def delete_note_by_id(self, note_id: int) -> bool:
+        with self._lock.exclusive():
+            self._sync()
+            entry = self._index.get(note_id)
+            if entry is None:
+                return False
+            self._append_tombstone(entry)
+        self._notify_write("delete", [note_id])
         return True
     
     def get_note_count(self) -> int:
-        return len(self.read_notes_as_blocks())
+        with self._reading():
+            return self._index.live_count()
 
-    def get_notes_structured(self) -> List[Dict[str, object]]:
+    def dead_ratio(self) -> float:
+        with self._reading():
+            return self._index.dead_ratio()
+
+    def compact(self) -> None:
+        """
+        Rewrite the notes file without deleted notes and tombstones.
+
+        Notes from files written before ids existed get their ``# Id:`` line
+        here, and a ``# Next-Id:`` mark keeps ids of deleted notes from being
+        handed out again.
+
+        The live blocks are written to a temporary file next to the notes
+        file, which then atomically replaces it, so a crash mid-way leaves
+        either the old or the new file intact.
+        """
+        with self._lock.exclusive():
+            self._sync()
+            entries = self._index.live_entries()
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            fd, tmp_path = tempfile.mkstemp(prefix=".notes-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as out, open(self.filename, "rb") as src:
+                    out.write(f"{NEXT_ID_PREFIX} {self._index.next_id}\n{SEPARATOR}\n".encode("utf-8"))
+                    for _, entry, raw in self._iter_raw_blocks(src, enumerate(entries)):
+                        block = self._decode_block(raw)
+                        if not block.startswith(ID_PREFIX):
+                            block = f"{ID_PREFIX} {entry.note_id}\n" + block
+                        out.write(block.encode("utf-8"))
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, self.filename)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._index.rebuild(self._lock.bump_generation())
+        self._notify_write("compact")
+
+    def compact_if_needed(self, threshold: Optional[float] = None) -> bool:
+        if threshold is None:
+            threshold = self.COMPACTION_THRESHOLD
+        with self._lock.exclusive():
+            if self.dead_ratio() < threshold:
+                return False
+            self.compact()
+        return True
+
+    def backup_to(self, path: str) -> None:
+        with self._lock.shared():
+            shutil.copy(self.filename, path)
+
+    def rebuild_index(self) -> None:
+        with self._lock.exclusive():
+            self._index.rebuild(self._lock.generation())
+
+    @contextmanager
+    def _reading(self):
+        """
+        Hold the shared lock with the index up to date.
+
+        Refreshing the index writes the sidecar, so when the notes file has
+        changed since the last sync the lock is upgraded to exclusive first.
+        """
+        with self._lock.shared():
+            if not self._index.is_current(self._lock.generation()):
+                with self._lock.exclusive():
+                    self._sync()
+            yield
+
+    def _sync(self) -> None:
+        self._index.sync(self._lock.generation())
+
+    def _prepare_append(self) -> None:
+        self._sync()
+        if self._index.has_tail():
+            with open(self.filename, "ab") as f:
+                f.write(f"\n{SEPARATOR}\n".encode("utf-8"))
+            self._sync()
+
+    def _write_raw(self, block: bytes, fsync: bool = False) -> int:
+        with open(self.filename, "ab") as f:
+            offset = f.tell()
+            f.write(block)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return offset
+
+    def _append_tombstone(self, entry: IndexEntry) -> None:
+        self._prepare_append()
+        block = f"{DELETED_PREFIX} {entry.offset}\n{SEPARATOR}\n".encode("utf-8")
+        offset = self._write_raw(block)
+        self._index.record(Tombstone(offset, len(block), entry.offset))
+
+    @staticmethod
+    def _read_block(f, entry: IndexEntry) -> str:
+        f.seek(entry.offset)
+        return NoteStorage._decode_block(f.read(entry.length))
+
+    @staticmethod
+    def _decode_block(raw: bytes) -> str:
+        text = raw.decode("utf-8", "replace").replace("\r\n", "\n").strip()
+        head, _, last_line = text.rpartition("\n")
+        if last_line.strip().startswith(SEPARATOR):
+            text = head.rstrip()
+        return text + "\n" + SEPARATOR + "\n"
+
+    def iter_notes(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   important_only: bool = False) -> Iterator[Dict[str, object]]:
+        """
+        Yield notes one at a time in the ``get_notes_structured`` format.
+
+        ``since``/``until`` (inclusive) and ``important_only`` are checked
+        against the index before a block is read, so filtered-out notes are
+        never loaded. Blocks are read in ``READ_CHUNK_SIZE`` chunks and only
+        the current chunk is held in memory.
+
+        With the ``mmap`` parser the file is memory-mapped instead, fields are
+        located by byte-level search and each note's content is decoded only
+        when it is accessed.
+
+        The notes are those present when iteration starts; the file handle
+        opened under the lock keeps reading the same data even if another
+        process compacts the file meanwhile.
+        """
+        entries, f = self._open_snapshot()
+        if f is None:
+            return
+
+        with f:
+            selected = self._select_entries(entries, since, until, important_only)
+            if self.parser == "mmap":
+                yield from iter_mmap_notes(f, selected)
+                return
+
+            for idx, entry, raw in self._iter_raw_blocks(f, selected):
+                dt_val, content, important = self._parse_block(self._decode_block(raw))
+                yield {
+                    "index": idx,
+                    "id": entry.note_id,
+                    "datetime": dt_val,
+                    "content": content,
+                    "important": important,
+                }
+
+    def iter_stamped_notes(self) -> Iterator[Tuple[str, Dict[str, object]]]:
         """
-        Return notes with parsed metadata for UI use.
-        Each item: {index, datetime (or None), content, important}
+        Yield ``(timestamp, note)`` for every note, the ``# Date:`` in ``DATE_FORMAT`` or "".
+
+        Unlike ``note["datetime"]`` the timestamp also covers older
+        date-only stamps, so copies of the notes keep their dates.
         """
-        blocks = self.read_notes_as_blocks()
-        parsed: List[Dict[str, object]] = []
-
-        for idx, block in enumerate(blocks):
-            lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
-            date_str: Optional[str] = None
-            content = ""
-            important = False
-
-            for line in lines:
-                if line.startswith("# Date:"):
-                    date_str = line[len("# Date:"):].strip()
-                elif line.startswith("# Note:"):
-                    content = line[len("# Note:"):].strip()
-                elif line.startswith("# Important:"):
-                    important = line[len("# Important:"):].strip().lower() == "true"
-
-            dt_val = None
-            if date_str:
-                try:
-                    dt_val = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    dt_val = None
-
-            parsed.append({
-                "index": idx,
-                "datetime": dt_val,
-                "content": content,
-                "important": important,
-            })
-
-        return parsed
+        with self._reading():
+            stamps = {entry.note_id: entry.timestamp for entry in self._index.live_entries()}
+        for note in self.iter_notes():
+            yield _full_timestamp(stamps.get(note["id"], "")), note
+
+    def _open_snapshot(self):
+        with self._reading():
+            entries = self._index.live_entries()
+            if not entries:
+                return entries, None
+            return entries, open(self.filename, "rb")
+
+    @staticmethod
+    def _select_entries(entries: List[IndexEntry], since: Optional[datetime], until: Optional[datetime],
+                        important_only: bool) -> Iterator[Tuple[int, IndexEntry]]:
+        since_key = since.strftime(DATE_FORMAT) if since else None
+        until_key = until.strftime(DATE_FORMAT) if until else None
+        for idx, entry in enumerate(entries):
+            if important_only and not entry.important:
+                continue
+            timestamp = entry.timestamp
+            if (since_key or until_key) and len(timestamp) != _TIMESTAMP_LENGTH:
+                timestamp = _full_timestamp(timestamp)
+            if since_key is not None and (not timestamp or timestamp < since_key):
+                continue
+            if until_key is not None and (not timestamp or timestamp > until_key):
+                continue
+            yield idx, entry
+
+    def _iter_raw_blocks(self, f, selected: Iterable[Tuple[int, IndexEntry]]):
+        buf = b""
+        buf_start = 0
+        for idx, entry in selected:
+            start = entry.offset - buf_start
+            end = start + entry.length
+            if start < 0 or end > len(buf):
+                f.seek(entry.offset)
+                buf = f.read(max(self.READ_CHUNK_SIZE, entry.length))
+                buf_start = entry.offset
+                start, end = 0, entry.length
+            yield idx, entry, buf[start:end]
+
+    @staticmethod
+    def _parse_block(block: str):
+        lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
+        date_str: Optional[str] = None
+        content = ""
+        important = False
+
+        for line in lines:
+            if line.startswith("# Date:"):
+                date_str = line[len("# Date:"):].strip()
+            elif line.startswith("# Note:"):
+                content = line[len("# Note:"):].strip()
+            elif line.startswith("# Important:"):
+                important = line[len("# Important:"):].strip().lower() == "true"
+
+        dt_val = None
+        if date_str:
+            try:
+                dt_val = datetime.strptime(date_str, DATE_FORMAT)
+            except ValueError:
+                dt_val = None
+
+        return dt_val, content, important
@@ -0,0 +1,155 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+_EPOCH = datetime(1970, 1, 1)
+NO_DATE = -(1 << 63)
+NO_INDEX = -1
+_MISSING = object()
+
+
+def to_epoch(dt_val: Optional[datetime]) -> int:
+    """Seconds from 1970-01-01 to the naive local ``dt_val``, or ``NO_DATE``."""
+    if dt_val is None:
+        return NO_DATE
+    delta = dt_val - _EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def from_epoch(seconds: int) -> Optional[datetime]:
+    return None if seconds == NO_DATE else _EPOCH + timedelta(seconds=seconds)
+
+
+class Note(Mapping):
+    """
+    One note as a slotted record, readable like the ``get_notes_structured`` dicts.
+
+    ``note["content"]`` and ``note.content`` are the same. ``analysis`` is
+    a key only when the note was loaded with its analysis result.
+    """
+
+    __slots__ = ("index", "id", "datetime", "content", "important", "_analysis")
+
+    _KEYS = ("index", "id", "datetime", "content", "important")
+
+    def __init__(self, index: Optional[int], note_id: Optional[int], dt_val: Optional[datetime], content: str,
+                 important: bool, analysis=_MISSING):
+        self.index = index
+        self.id = note_id
+        self.datetime = dt_val
+        self.content = content
+        self.important = important
+        self._analysis = analysis
+
+    @classmethod
+    def from_mapping(cls, note: Mapping) -> "Note":
+        return cls(note["index"], note["id"], note["datetime"], note["content"], note["important"],
+                   note.get("analysis", _MISSING))
+
+    @property
+    def analysis(self) -> Optional[Dict[str, object]]:
+        return None if self._analysis is _MISSING else self._analysis
+
+    def __getitem__(self, key: str):
+        if key in self._KEYS:
+            return getattr(self, key)
+        if key == "analysis" and self._analysis is not _MISSING:
+            return self._analysis
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._KEYS
+        if self._analysis is not _MISSING:
+            yield "analysis"
+
+    def __len__(self) -> int:
+        return len(self._KEYS) + (self._analysis is not _MISSING)
+
+    def __repr__(self) -> str:
+        return f"Note({dict(self)!r})"
+
+
+class NoteTable(Sequence):
+    """
+    Notes stored column by column, as returned by ``get_notes_structured``.
+
+    Ids, positions and timestamps (whole seconds from 1970-01-01 in local
+    time) are ``array("q")`` columns, the important flags a bitmap with one
+    bit per note, and all contents share one UTF-8 buffer addressed by an
+    offsets column; ``NO_INDEX`` and ``NO_DATE`` stand for None. Indexing
+    or iterating builds a ``Note`` for each row on the fly, so existing
+    ``notes[i]["content"]`` callers keep working, while the table itself
+    costs a few dozen bytes per note besides the text. The columns are
+    plain buffers and can be wrapped with ``numpy.frombuffer``.
+    """
+
+    def __init__(self, notes: Iterable[Mapping] = ()):
+        self.indexes = array("q")
+        self.ids = array("q")
+        self.epochs = array("q")
+        self.offsets = array("q", [0])
+        self._important = bytearray()
+        self._content = bytearray()
+        self._analysis: Optional[List[Optional[Dict[str, object]]]] = None
+        for note in notes:
+            self.append(note)
+
+    def append(self, note: Mapping) -> None:
+        """Add a row; an ``analysis`` key in the first note makes it a column for every row."""
+        row = len(self.ids)
+        if row == 0 and "analysis" in note:
+            self._analysis = []
+        index = note["index"]
+        self.indexes.append(NO_INDEX if index is None else index)
+        self.ids.append(note["id"])
+        self.epochs.append(to_epoch(note["datetime"]))
+        if row % 8 == 0:
+            self._important.append(0)
+        if note["important"]:
+            self._important[row >> 3] |= 1 << (row & 7)
+        self._content += note["content"].encode("utf-8")
+        self.offsets.append(len(self._content))
+        if self._analysis is not None:
+            self._analysis.append(note.get("analysis"))
+
+    def important(self, row: int) -> bool:
+        return bool(self._important[row >> 3] >> (row & 7) & 1)
+
+    def content(self, row: int) -> str:
+        return self._content[self.offsets[row]:self.offsets[row + 1]].decode("utf-8")
+
+    def nbytes(self) -> int:
+        """Bytes held by the columns and the content buffer."""
+        columns = (self.indexes, self.ids, self.epochs, self.offsets)
+        return sum(c.itemsize * len(c) for c in columns) + len(self._important) + len(self._content)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("note table index out of range")
+        index = self.indexes[row]
+        return Note(
+            None if index == NO_INDEX else index,
+            self.ids[row],
+            from_epoch(self.epochs[row]),
+            self.content(row),
+            self.important(row),
+            _MISSING if self._analysis is None else self._analysis[row],
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"NoteTable({len(self)} notes)"
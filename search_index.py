@@ -0,0 +1,218 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from storage_backend import StorageBackend
+
+_WORD = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def normalize(text: str) -> str:
+    """Lower-case ``text`` and strip diacritics, so "Úkol" and "ukol" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+class SearchHit(NamedTuple):
+    note_id: int
+    score: float
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over note content with BM25 ranking.
+
+    Each term maps to the notes containing it and the term's positions in
+    them. Queries are whitespace-separated parts that must all match: a
+    word, a prefix ending in ``*`` (``uko*``) or a ``"quoted phrase"``
+    whose words must be adjacent. Matching is case- and
+    diacritic-insensitive. The candidates are narrowed down starting from
+    the rarest part, then ranked with BM25.
+
+    ``build`` loads every note and subscribes to the storage's write
+    notifications, after which adds and deletes made through that storage
+    object update the index incrementally. ``search`` builds on first use.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self._postings: Dict[str, Dict[int, Tuple[int, ...]]] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._sorted_terms: Optional[List[str]] = None
+        self._lock = threading.RLock()
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def build(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+            self._sorted_terms = None
+            for note in self.storage.iter_notes():
+                self.add(note["id"], note["content"])
+            if not self._built:
+                self.storage.add_write_listener(self._on_write)
+                self._built = True
+
+    def close(self) -> None:
+        self.storage.remove_write_listener(self._on_write)
+        self._built = False
+
+    def add(self, note_id: int, content: str) -> None:
+        tokens = tokenize(content)
+        positions: Dict[str, List[int]] = {}
+        for pos, term in enumerate(tokens):
+            positions.setdefault(term, []).append(pos)
+
+        with self._lock:
+            if note_id in self._doc_len:
+                self.remove(note_id)
+            for term, term_positions in positions.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._sorted_terms = None
+                postings[note_id] = tuple(term_positions)
+            self._doc_terms[note_id] = tuple(positions)
+            self._doc_len[note_id] = len(tokens)
+            self._total_len += len(tokens)
+
+    def remove(self, note_id: int) -> bool:
+        with self._lock:
+            terms = self._doc_terms.pop(note_id, None)
+            if terms is None:
+                return False
+            for term in terms:
+                postings = self._postings[term]
+                del postings[note_id]
+                if not postings:
+                    del self._postings[term]
+                    self._sorted_terms = None
+            self._total_len -= self._doc_len.pop(note_id)
+            return True
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """Return up to ``limit`` notes matching every part of ``query``, best first."""
+        if not self._built:
+            self.build()
+
+        with self._lock:
+            parts = self._parse(query)
+            if not parts or not self._doc_len:
+                return []
+
+            matched = [self._match_part(part) for part in parts]
+            matched.sort(key=lambda m: len(m[1]))
+            candidates = set(matched[0][1])
+            for _, note_ids in matched[1:]:
+                candidates.intersection_update(note_ids)
+                if not candidates:
+                    return []
+
+            # Scores are only computed for notes that matched every part.
+            k1, b = self.K1, self.B
+            doc_len = self._doc_len
+            avg_len = self._total_len / len(doc_len) or 1
+            norm = {n: k1 * (1 - b + b * doc_len[n] / avg_len) for n in candidates}
+            scores = dict.fromkeys(candidates, 0.0)
+            for terms, _ in matched:
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = self._idf(len(postings))
+                    for note_id in candidates if len(candidates) < len(postings) else postings:
+                        positions = postings.get(note_id)
+                        if positions and note_id in norm:
+                            tf = len(positions)
+                            scores[note_id] += idf * tf * (k1 + 1) / (tf + norm[note_id])
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [SearchHit(note_id, score) for note_id, score in best]
+
+    def _parse(self, query: str) -> List[Tuple[str, Sequence[str]]]:
+        parts = []
+        for phrase, word in _QUERY_PART.findall(query):
+            if phrase:
+                terms = tokenize(phrase)
+                if terms:
+                    parts.append(("phrase", terms))
+            elif word.endswith("*") and tokenize(word):
+                parts.append(("prefix", tokenize(word)[:1]))
+            else:
+                parts.extend(("term", [term]) for term in tokenize(word))
+        return parts
+
+    def _match_part(self, part: Tuple[str, Sequence[str]]) -> Tuple[List[str], Collection[int]]:
+        """The indexed terms that score a query part and the notes matching it."""
+        kind, terms = part
+        if kind == "term":
+            return [terms[0]] if terms[0] in self._postings else [], self._postings.get(terms[0], {})
+        if kind == "prefix":
+            expanded = self._terms_with_prefix(terms[0])
+            if len(expanded) == 1:
+                return expanded, self._postings[expanded[0]]
+            note_ids = set()
+            for term in expanded:
+                note_ids.update(self._postings[term])
+            return expanded, note_ids
+
+        postings = [self._postings.get(term) for term in terms]
+        if not all(postings):
+            return [], ()
+        candidates = set(min(postings, key=len))
+        for term_postings in postings:
+            candidates.intersection_update(term_postings)
+        return list(terms), {n for n in candidates if self._has_phrase(n, postings)}
+
+    @staticmethod
+    def _has_phrase(note_id: int, postings: List[Dict[int, Tuple[int, ...]]]) -> bool:
+        starts = set(postings[0][note_id])
+        for offset, term_postings in enumerate(postings[1:], 1):
+            starts.intersection_update(pos - offset for pos in term_postings[note_id])
+            if not starts:
+                return False
+        return True
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (len(self._doc_len) - df + 0.5) / (df + 0.5))
+
+    def _terms_with_prefix(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = []
+        for term in self._sorted_terms[bisect_left(self._sorted_terms, prefix):]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _on_write(self, kind: str = "", note_ids: Sequence[int] = ()) -> None:
+        if kind == "add":
+            for note_id in note_ids:
+                note = self.storage.get_note(note_id)
+                if note is not None:
+                    self.add(note_id, note["content"])
+        elif kind == "delete":
+            for note_id in note_ids:
+                self.remove(note_id)
@@ -0,0 +1,310 @@
+"""
+Note storage split into one notes file per month.
+
+Usage: python sharded_storage.py import|export [--text notes.txt] [--dir notes]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_lock import FileLock
+from note_storage import NoteStorage, DATE_FORMAT, format_block, write_notes_file
+from storage_backend import StorageBackend
+
+UNDATED = "undated"
+NEXT_ID_FILE = "next-id"
+_SHARD_NAME = re.compile(r"^(\d{4}-\d{2}|undated)\.txt$")
+
+
+def _shard_key(dt_val: Optional[datetime]) -> str:
+    return dt_val.strftime("%Y-%m") if dt_val else UNDATED
+
+
+def _scan_shard(func: Callable[..., Iterable], path: str, since: Optional[datetime], until: Optional[datetime],
+                args: Tuple) -> list:
+    return list(func(NoteStorage(path), since, until, *args))
+
+
+def _list_notes(storage: StorageBackend, since: Optional[datetime], until: Optional[datetime]) -> Iterable:
+    return storage.iter_notes(since=since, until=until)
+
+
+class ShardedNoteStorage(StorageBackend):
+    """
+    Notes kept in a directory with one notes.txt-format file per month.
+
+    ``YYYY-MM.txt`` holds the notes written in that month and
+    ``undated.txt`` the ones without a date, each with its own index and
+    lock as in ``NoteStorage``. New notes go to the current month's file,
+    a date-bounded ``iter_notes`` only opens the months in range and a
+    delete only touches the file the note lives in. Ids stay unique across
+    files through the ``next-id`` counter, updated under the directory's
+    lock.
+
+    ``get_notes_structured`` and ``scan_partitions`` read the month files
+    in parallel in up to ``workers`` processes once they hold at least
+    ``PARALLEL_MIN_BYTES`` between them; smaller scans stay in this process,
+    where starting the workers would cost more than it saves. The pool is
+    started on first use and kept until ``close``. Notes are ordered by
+    month, undated first, then in the order they were written.
+    """
+
+    PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, directory: str = "notes", workers: Optional[int] = None):
+        self.filename = directory
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self._lock = FileLock(os.path.join(directory, ".lock"))
+        self._shards: Dict[str, NoteStorage] = {}
+        self._shard_of: Dict[int, str] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def add_note(self, content: str, important: bool = False) -> int:
+        return self.add_notes([(content, important)])[0]
+
+    def add_notes(self, notes: Iterable[Tuple[str, bool]], fsync: bool = False) -> List[int]:
+        notes = list(notes)
+        now = time.localtime()
+        key = time.strftime("%Y-%m", now)
+        with self._lock.exclusive():
+            shard = self._shard(key)
+            ids = shard._append_notes(notes, time.strftime(DATE_FORMAT, now), fsync, min_id=self._next_id())
+            if ids:
+                self._write_next_id(ids[-1] + 1)
+        for note_id in ids:
+            self._shard_of[note_id] = key
+        if ids:
+            self._notify_write("add", ids)
+        return ids
+
+    def delete_note(self, index: int) -> bool:
+        if index < 0:
+            return False
+        for key in self._keys():
+            shard = self._shard(key)
+            with shard._reading():
+                entries = shard._index.live_entries()
+                if index < len(entries):
+                    note_id = entries[index].note_id
+                    break
+            index -= len(entries)
+        else:
+            return False
+        return self.delete_note_by_id(note_id)
+
+    def delete_note_by_id(self, note_id: int) -> bool:
+        key = self._shard_of.get(note_id)
+        keys = [key] if key is not None else reversed(self._keys())
+        for key in keys:
+            if self._shard(key).delete_note_by_id(note_id):
+                self._shard_of.pop(note_id, None)
+                self._notify_write("delete", [note_id])
+                return True
+        return False
+
+    def get_note(self, note_id: int) -> Optional[Dict[str, object]]:
+        key = self._shard_of.get(note_id)
+        if key is not None:
+            return self._shard(key).get_note(note_id)
+        for key in reversed(self._keys()):
+            note = self._shard(key).get_note(note_id)
+            if note is not None:
+                self._shard_of[note_id] = key
+                return note
+        return None
+
+    def get_note_count(self) -> int:
+        return sum(self._shard(key).get_note_count() for key in self._keys())
+
+    def iter_notes(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   important_only: bool = False) -> Iterator[Dict[str, object]]:
+        """
+        Yield notes like ``NoteStorage.iter_notes``, opening only the months between ``since`` and ``until``.
+
+        ``index`` is None when a date range is given, since counting the
+        notes before it would mean opening the months outside the range.
+        """
+        bounded = since is not None or until is not None
+        offset = 0
+        for key in self._keys(since, until):
+            shard = self._shard(key)
+            for note in shard.iter_notes(since=since, until=until, important_only=important_only):
+                self._shard_of[note["id"]] = key
+                if bounded or offset:
+                    note = dict(note, index=None if bounded else note["index"] + offset)
+                yield note
+            if not bounded:
+                offset += shard.get_note_count()
+
+    def read_notes_as_blocks(self) -> List[str]:
+        blocks = []
+        for key in self._keys():
+            blocks.extend(self._shard(key).read_notes_as_blocks())
+        return blocks
+
+    def scan_partitions(self, func: Callable[..., Iterable], *args, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None) -> Iterator[Iterable]:
+        for _, result in self._map_shards(func, since, until, args):
+            yield result
+
+    def data_files(self) -> List[str]:
+        names = [f"{key}.txt" for key in self._keys()] + [NEXT_ID_FILE]
+        return [p for p in (os.path.join(self.directory, name) for name in names) if os.path.exists(p)]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def compact(self) -> None:
+        for key in self._keys():
+            self._shard(key).compact()
+        self._notify_write("compact")
+
+    def compact_if_needed(self, threshold: Optional[float] = None) -> bool:
+        compacted = False
+        for key in self._keys():
+            compacted = self._shard(key).compact_if_needed(threshold) or compacted
+        if compacted:
+            self._notify_write("compact")
+        return compacted
+
+    def rebuild_index(self) -> None:
+        for key in self._keys():
+            self._shard(key).rebuild_index()
+
+    def backup_to(self, path: str) -> None:
+        self.export_to_text(path)
+
+    def import_from_text(self, path: str) -> int:
+        """
+        Split a notes.txt file into month files, keeping ids and timestamps. Returns the number imported.
+
+        The directory must not hold any notes yet. Each month file is
+        written to a temp file and renamed into place once complete.
+        """
+        source = NoteStorage(path)
+        with self._lock.exclusive():
+            if self._keys():
+                raise ValueError(f"{self.directory} already holds notes")
+            outputs: Dict[str, Tuple[str, object]] = {}
+            imported = 0
+            try:
+                for timestamp, note in source.iter_stamped_notes():
+                    key = timestamp[:7] or UNDATED
+                    if key not in outputs:
+                        fd, tmp_path = tempfile.mkstemp(prefix=".shard-", suffix=".tmp", dir=self.directory)
+                        outputs[key] = (tmp_path, os.fdopen(fd, "wb"))
+                    block = format_block(note["id"], timestamp, note["content"], note["important"])
+                    outputs[key][1].write(block.encode("utf-8"))
+                    imported += 1
+                for key, (tmp_path, out) in outputs.items():
+                    out.flush()
+                    os.fsync(out.fileno())
+                    out.close()
+                    os.replace(tmp_path, os.path.join(self.directory, f"{key}.txt"))
+            except BaseException:
+                for tmp_path, out in outputs.values():
+                    out.close()
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                raise
+            self._write_next_id(self._shard_next_id(source))
+        self._shards.clear()
+        return imported
+
+    def export_to_text(self, path: str) -> int:
+        """Write all notes to a single notes.txt file atomically. Returns the number exported."""
+        return write_notes_file(path, self.iter_notes(), self._next_id())
+
+    def _all_notes(self) -> Iterator[Dict[str, object]]:
+        offset = 0
+        for key, shard_notes in self._map_shards(_list_notes, None, None, ()):
+            count = 0
+            for count, note in enumerate(shard_notes, 1):
+                note["index"] += offset
+                self._shard_of[note["id"]] = key
+                yield note
+            offset += count
+
+    def _map_shards(self, func: Callable[..., Iterable], since: Optional[datetime], until: Optional[datetime],
+                    args: Tuple) -> Iterator[Tuple[str, Iterable]]:
+        keys = self._keys(since, until)
+        paths = [os.path.join(self.directory, f"{key}.txt") for key in keys]
+        if (self.workers <= 1 or len(keys) <= 1
+                or sum(os.path.getsize(path) for path in paths) < self.PARALLEL_MIN_BYTES):
+            for key in keys:
+                yield key, func(self._shard(key), since, until, *args)
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        futures = [self._pool.submit(_scan_shard, func, path, since, until, args) for path in paths]
+        for key, future in zip(keys, futures):
+            yield key, future.result()
+
+    def _keys(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[str]:
+        keys = []
+        for name in os.listdir(self.directory):
+            match = _SHARD_NAME.match(name)
+            if match:
+                keys.append(match.group(1))
+        # "undated" sorts after the digits, but undated notes predate the dated ones.
+        keys.sort(key=lambda k: (k != UNDATED, k))
+        if since is None and until is None:
+            return keys
+        first = _shard_key(since) if since else ""
+        last = _shard_key(until) if until else "9999-99"
+        return [k for k in keys if k != UNDATED and first <= k <= last]
+
+    def _shard(self, key: str) -> NoteStorage:
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = self._shards[key] = NoteStorage(os.path.join(self.directory, f"{key}.txt"))
+        return shard
+
+    def _next_id(self) -> int:
+        try:
+            with open(os.path.join(self.directory, NEXT_ID_FILE), "r", encoding="ascii") as f:
+                return int(f.read().strip() or 1)
+        except (FileNotFoundError, ValueError):
+            return max((self._shard_next_id(self._shard(key)) for key in self._keys()), default=1)
+
+    @staticmethod
+    def _shard_next_id(shard: NoteStorage) -> int:
+        with shard._reading():
+            return shard._index.next_id
+
+    def _write_next_id(self, next_id: int) -> None:
+        path = os.path.join(self.directory, NEXT_ID_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write(f"{next_id}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move notes between notes.txt and month files in a directory.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("--text", default="notes.txt", help="notes.txt file")
+    parser.add_argument("--dir", default="notes", help="directory of month files")
+    args = parser.parse_args()
+
+    storage = ShardedNoteStorage(args.dir)
+    if args.command == "import":
+        print(f"Imported {storage.import_from_text(args.text)} notes into {args.dir}")
+    else:
+        print(f"Exported {storage.export_to_text(args.text)} notes to {args.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 1 << 20
+
+
+class SnapshotStore:
+    """
+    Timestamped, compressed copies of the notes file in one directory.
+
+    Each snapshot is streamed through the compressor into a temp file that
+    is fsynced and renamed into place, then recorded in ``manifest.json``
+    with the size and SHA-256 of both the original and the compressed
+    bytes: ``verify`` only hashes the compressed file, and ``restore``
+    checks the original hash while it decompresses.
+
+    ``prune`` keeps the newest ``keep_last`` snapshots plus the newest one
+    of each of the last ``keep_hourly`` hours and ``keep_daily`` days.
+    ``compression`` is ``gzip``, ``zstd`` (needs the ``zstandard`` package)
+    or ``none``. The directory is created by the first ``create``.
+    """
+
+    SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+    NAME_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+    def __init__(self, directory: str, prefix: str = "notes", compression: str = "gzip", keep_last: int = 10,
+                 keep_hourly: int = 24, keep_daily: int = 7):
+        if compression not in self.SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.keep_last = keep_last
+        self.keep_hourly = keep_hourly
+        self.keep_daily = keep_daily
+        self._lock = threading.Lock()
+
+    def list(self) -> List[Dict[str, object]]:
+        """Manifest entries, oldest first."""
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def latest(self) -> Optional[Dict[str, object]]:
+        entries = self.list()
+        return entries[-1] if entries else None
+
+    def get(self, name: str) -> Dict[str, object]:
+        for entry in self.list():
+            if entry["name"] == name:
+                return entry
+        raise KeyError(name)
+
+    def create(self, src: BinaryIO, now: Optional[datetime] = None, size: Optional[int] = None) -> Dict[str, object]:
+        """
+        Compress ``src`` from its start into a new snapshot, then apply the retention policy.
+
+        With ``size`` only that many bytes are read, so a file that keeps growing can be copied as it was.
+        """
+        now = now or datetime.now()
+        name = f"{self.prefix}-{now.strftime(self.NAME_FORMAT)}.txt{self.SUFFIXES[self.compression]}"
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".tmp", dir=self.directory)
+        raw_hash = hashlib.sha256()
+        raw_size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                with self._compressor(out) as sink:
+                    src.seek(0)
+                    while size is None or raw_size < size:
+                        chunk = src.read(CHUNK_SIZE if size is None else min(CHUNK_SIZE, size - raw_size))
+                        if not chunk:
+                            break
+                        raw_hash.update(chunk)
+                        raw_size += len(chunk)
+                        sink.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            stored_hash = self._hash_file(tmp_path)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        entry = {
+            "name": name,
+            "created": now.isoformat(),
+            "compression": self.compression,
+            "size": raw_size,
+            "sha256": raw_hash.hexdigest(),
+            "stored_size": os.path.getsize(os.path.join(self.directory, name)),
+            "stored_sha256": stored_hash,
+        }
+        with self._lock:
+            self._write_manifest(self.list() + [entry])
+        self.prune(now)
+        return entry
+
+    def verify(self, name: str) -> bool:
+        """Check a snapshot against its manifest checksum without decompressing it."""
+        entry = self.get(name)
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path) or os.path.getsize(path) != entry["stored_size"]:
+            return False
+        return self._hash_file(path) == entry["stored_sha256"]
+
+    def restore(self, name: str, target: str) -> None:
+        """Decompress a snapshot to ``target`` atomically, checking the original checksum on the way."""
+        entry = self.get(name)
+        directory = os.path.dirname(os.path.abspath(target))
+        fd, tmp_path = tempfile.mkstemp(prefix=".restore-", suffix=".tmp", dir=directory)
+        raw_hash = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as out, self._decompressor(os.path.join(self.directory, name),
+                                                               entry["compression"]) as src:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    raw_hash.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            if raw_hash.hexdigest() != entry["sha256"]:
+                raise ValueError(f"Snapshot {name} does not match its checksum")
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def prune(self, now: Optional[datetime] = None) -> List[str]:
+        """Delete snapshots outside the retention policy. Returns the removed names."""
+        now = now or datetime.now()
+        with self._lock:
+            entries = self.list()
+            if not entries:
+                return []
+            keep = {e["name"] for e in entries[-self.keep_last:]} if self.keep_last else set()
+            for bucket_format, count, span in (("%Y%m%d%H", self.keep_hourly, timedelta(hours=1)),
+                                               ("%Y%m%d", self.keep_daily, timedelta(days=1))):
+                oldest = now - span * count
+                newest_in_bucket: Dict[str, str] = {}
+                for entry in entries:
+                    created = datetime.fromisoformat(entry["created"])
+                    if created > oldest:
+                        newest_in_bucket[created.strftime(bucket_format)] = entry["name"]
+                keep.update(newest_in_bucket.values())
+
+            removed = [e["name"] for e in entries if e["name"] not in keep]
+            self._write_manifest([e for e in entries if e["name"] in keep])
+            for name in removed:
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+        return removed
+
+    def _compressor(self, out: BinaryIO):
+        if self.compression == "gzip":
+            return gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().stream_writer(out, closefd=False)
+        return _Uncompressed(out)
+
+    @staticmethod
+    def _decompressor(path: str, compression: str):
+        if compression == "gzip":
+            return gzip.open(path, "rb")
+        if compression == "zstd":
+            if zstandard is None:
+                raise ValueError("zstd compression needs the zstandard package")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return open(path, "rb")
+
+    def _write_manifest(self, entries: List[Dict[str, object]]) -> None:
+        path = os.path.join(self.directory, MANIFEST)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class _Uncompressed:
+    """Pass-through writer with the same context-manager shape as the compressors."""
+
+    def __init__(self, out: BinaryIO):
+        self._out = out
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def write(self, data: bytes) -> int:
+        return self._out.write(data)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from note_parser import parse_timestamp
+from note_storage import NoteStorage, DATE_FORMAT, format_note, write_notes_file
+from storage_backend import StorageBackend
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    content TEXT NOT NULL,
+    important INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_notes_created ON notes (created);
+CREATE INDEX IF NOT EXISTS idx_notes_important_created ON notes (important, created);
+"""
+
+# Statements are kept as constants with placeholders so sqlite3's per-connection
+# statement cache reuses the prepared statement on every call.
+_INSERT = "INSERT INTO notes (created, content, important) VALUES (?, ?, ?)"
+_INSERT_WITH_ID = "INSERT INTO notes (id, created, content, important) VALUES (?, ?, ?, ?)"
+_DELETE = "DELETE FROM notes WHERE id = ?"
+_SELECT_ONE = "SELECT id, created, content, important FROM notes WHERE id = ?"
+_SELECT_AT = "SELECT id FROM notes ORDER BY id LIMIT 1 OFFSET ?"
+_COUNT = "SELECT COUNT(*) FROM notes"
+_NEXT_ID = "SELECT seq FROM sqlite_sequence WHERE name = 'notes'"
+
+
+class SQLiteNoteStorage(StorageBackend):
+    """
+    Note storage in a SQLite database, with the same API as ``NoteStorage``.
+
+    The database runs in WAL mode so readers do not block the writer, and
+    ``created``/``important`` are indexed, so date and importance filters
+    in ``iter_notes`` are answered from the index instead of a full scan.
+    """
+
+    def __init__(self, filename: str = "notes.db"):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False, cached_statements=64)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add_note(self, content: str, important: bool = False) -> int:
+        if not content.strip():
+            raise ValueError("Cannot add empty note")
+
+        timestamp = time.strftime(DATE_FORMAT, time.localtime())
+        with self._lock, self._conn:
+            cursor = self._conn.execute(_INSERT, (timestamp, content, int(important)))
+        self._notify_write("add", [cursor.lastrowid])
+        return cursor.lastrowid
+
+    def add_notes(self, notes: Iterable[Tuple[str, bool]], fsync: bool = False) -> List[int]:
+        """
+        Insert several notes in one transaction.
+
+        The database runs in WAL mode with ``synchronous=NORMAL``, where a
+        commit survives a crash of the process but not necessarily a power
+        loss. With ``fsync`` this transaction is committed with
+        ``synchronous=FULL`` instead, so it is on disk when this returns.
+        """
+        notes = list(notes)
+        if any(not content.strip() for content, _ in notes):
+            raise ValueError("Cannot add empty note")
+
+        timestamp = time.strftime(DATE_FORMAT, time.localtime())
+        ids = []
+        with self._lock:
+            if fsync:
+                self._conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with self._conn:
+                    for content, important in notes:
+                        ids.append(self._conn.execute(_INSERT, (timestamp, content, int(important))).lastrowid)
+            finally:
+                if fsync:
+                    self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._notify_write("add", ids)
+        return ids
+
+    def delete_note(self, index: int) -> bool:
+        if index < 0:
+            return False
+        with self._lock, self._conn:
+            row = self._conn.execute(_SELECT_AT, (index,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute(_DELETE, (row[0],))
+        self._notify_write("delete", [row[0]])
+        return True
+
+    def delete_note_by_id(self, note_id: int) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(_DELETE, (note_id,))
+        if cursor.rowcount > 0:
+            self._notify_write("delete", [note_id])
+        return cursor.rowcount > 0
+
+    def get_note(self, note_id: int) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute(_SELECT_ONE, (note_id,)).fetchone()
+        if row is None:
+            return None
+        note = self._row_to_note(None, row)
+        del note["index"]
+        return note
+
+    def get_note_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(_COUNT).fetchone()[0]
+
+    def iter_notes(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   important_only: bool = False) -> Iterator[Dict[str, object]]:
+        """
+        Yield notes ordered by id. Filters run as indexed SQL conditions;
+        ``index`` is only filled in for unfiltered scans.
+        """
+        clauses = []
+        params: List[object] = []
+        if since is not None:
+            clauses.append("created >= ?")
+            params.append(since.strftime(DATE_FORMAT))
+        if until is not None:
+            clauses.append("created <= ?")
+            params.append(until.strftime(DATE_FORMAT))
+        if important_only:
+            clauses.append("important = 1")
+        sql = "SELECT id, created, content, important FROM notes"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+
+        with self._lock:
+            rows = self._conn.execute(sql, params)
+            batch = rows.fetchmany(1000)
+        position = 0
+        while batch:
+            for row in batch:
+                yield self._row_to_note(None if clauses else position, row)
+                position += 1
+            with self._lock:
+                batch = rows.fetchmany(1000)
+
+    def read_notes_as_blocks(self) -> List[str]:
+        return [format_note(n) for n in self.iter_notes()]
+
+    def backup_to(self, path: str) -> None:
+        target = sqlite3.connect(path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+
+    def data_files(self) -> List[str]:
+        return [p for p in (self.filename, self.filename + "-wal") if os.path.exists(p)]
+
+    def next_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute(_NEXT_ID).fetchone()
+        return (row[0] if row else 0) + 1
+
+    def import_from_text(self, path: str) -> int:
+        """Copy every note from a notes.txt file, keeping ids and timestamps. Returns the number imported."""
+        source = NoteStorage(path)
+        rows = (
+            (n["id"], timestamp, n["content"], int(n["important"]))
+            for timestamp, n in source.iter_stamped_notes()
+        )
+        return self._insert_many(rows)
+
+    def export_to_text(self, path: str) -> int:
+        """Write all notes to a notes.txt file atomically. Returns the number exported."""
+        return write_notes_file(path, self.iter_notes(), self.next_id())
+
+    def _insert_many(self, rows: Iterable[Tuple[int, str, str, int]]) -> int:
+        rows = list(rows)
+        before = self.get_note_count()
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT_WITH_ID, rows)
+        self._notify_write("add", [row[0] for row in rows])
+        return self.get_note_count() - before
+
+    @staticmethod
+    def _row_to_note(position: Optional[int], row) -> Dict[str, object]:
+        note_id, created, content, important = row
+        return {
+            "index": position,
+            "id": note_id,
+            "datetime": parse_timestamp(created.encode("ascii", "replace")),
+            "content": content,
+            "important": bool(important),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move notes between notes.txt and a SQLite database.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("--text", default="notes.txt", help="notes.txt file")
+    parser.add_argument("--db", default="notes.db", help="SQLite database file")
+    args = parser.parse_args()
+
+    storage = SQLiteNoteStorage(args.db)
+    try:
+        if args.command == "import":
+            print(f"Imported {storage.import_from_text(args.text)} notes into {args.db}")
+        else:
+            print(f"Exported {storage.export_to_text(args.text)} notes to {args.text}")
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from analysis_store import AnalysisStore
+from note_table import NoteTable
+
+BACKENDS = ("text", "sqlite", "sharded")
+BACKEND_ENV_VAR = "NOTE_TAKER_BACKEND"
+
+
+class StorageBackend(ABC):
+    """
+    Interface shared by the note storage backends.
+
+    Notes are returned as mappings with the keys
+    ``index, id, datetime, content, important``. ``index`` is the position
+    among all live notes; a backend that cannot compute it cheaply for a
+    filtered scan may return None there.
+    """
+
+    filename: str
+    _analysis: Optional[AnalysisStore] = None
+    _write_listeners: Tuple[Callable[[str, Sequence[int]], None], ...] = ()
+
+    @abstractmethod
+    def add_note(self, content: str, important: bool = False) -> int:
+        ...
+
+    def add_notes(self, notes: Iterable[Tuple[str, bool]], fsync: bool = False) -> List[int]:
+        return [self.add_note(content, important) for content, important in notes]
+
+    @abstractmethod
+    def delete_note(self, index: int) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_note_by_id(self, note_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def get_note(self, note_id: int) -> Optional[Dict[str, object]]:
+        ...
+
+    @abstractmethod
+    def get_note_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def iter_notes(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   important_only: bool = False) -> Iterator[Dict[str, object]]:
+        ...
+
+    @abstractmethod
+    def read_notes_as_blocks(self) -> List[str]:
+        ...
+
+    def get_notes_structured(self, with_analysis: bool = False, min_words: Optional[int] = None,
+                             priority: Optional[str] = None) -> NoteTable:
+        """
+        Return notes with parsed metadata for UI use, as a ``NoteTable``.
+        Each item reads like {index, id, datetime (or None), content, important}
+
+        With ``with_analysis`` or an analysis filter (``min_words``,
+        ``priority``) each note also gets an ``analysis`` key holding its
+        stored result, or None if it has not been analysed yet; filtered
+        calls leave out notes without a matching result.
+        """
+        if not with_analysis and min_words is None and priority is None:
+            return NoteTable(self._all_notes())
+
+        results = self.analysis_results()
+        results.refresh()
+        wanted = None
+        if min_words is not None or priority is not None:
+            wanted = results.ids_where(min_words=min_words, priority=priority)
+
+        return NoteTable(
+            dict(note, analysis=results.get(note["id"]))
+            for note in self._all_notes()
+            if wanted is None or note["id"] in wanted
+        )
+
+    def scan_partitions(self, func: Callable[..., Iterable], *args, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None) -> Iterator[Iterable]:
+        """
+        Yield ``func(storage, since, until, *args)`` for each part of the notes, in note order.
+
+        Backends that split their notes into separate files scan the parts
+        in parallel worker processes, so ``func`` must be a module-level
+        function and its results picklable; everything else makes a single
+        call with this object.
+        """
+        yield func(self, since, until, *args)
+
+    def data_files(self) -> List[str]:
+        """The files holding the notes, for change detection by backups."""
+        return [self.filename] if os.path.exists(self.filename) else []
+
+    def _all_notes(self) -> Iterable[Dict[str, object]]:
+        return self.iter_notes()
+
+    def analysis_results(self) -> AnalysisStore:
+        """
+        Analysis results for these notes, stored in ``<filename>.analysis``.
+
+        Once opened, the results of notes deleted through this object are
+        dropped from it.
+        """
+        if self._analysis is None:
+            self._analysis = AnalysisStore(self.filename + ".analysis")
+            self.add_write_listener(self._drop_deleted_results)
+        return self._analysis
+
+    def _drop_deleted_results(self, kind: str, note_ids: Sequence[int]) -> None:
+        if kind == "delete":
+            self._analysis.remove_many(note_ids)
+
+    def add_write_listener(self, listener: Callable[[str, Sequence[int]], None]) -> None:
+        """
+        Call ``listener(kind, note_ids)`` after every write made through this object.
+
+        ``kind`` is ``add`` or ``delete`` with the affected note ids, or
+        ``compact`` with no ids.
+        """
+        self._write_listeners = self._write_listeners + (listener,)
+
+    def remove_write_listener(self, listener: Callable[[str, Sequence[int]], None]) -> None:
+        self._write_listeners = tuple(l for l in self._write_listeners if l != listener)
+
+    def _notify_write(self, kind: str, note_ids: Sequence[int] = ()) -> None:
+        for listener in self._write_listeners:
+            try:
+                listener(kind, note_ids)
+            except Exception as e:
+                print(f"\n[STORAGE LISTENER ERROR]: {e}")
+
+    def compact_if_needed(self, threshold: Optional[float] = None) -> bool:
+        return False
+
+    def close(self) -> None:
+        """Release files, connections or workers held open by this object."""
+
+    def backup_to(self, path: str) -> None:
+        shutil.copy(self.filename, path)
+
+
+def open_storage(backend: Optional[str] = None, filename: Optional[str] = None) -> StorageBackend:
+    """
+    Create the storage for ``backend`` ("text", "sqlite" or "sharded").
+
+    When ``backend`` is not given, the ``NOTE_TAKER_BACKEND`` environment
+    variable is used, defaulting to the plain notes.txt storage.
+    """
+    backend = backend or os.environ.get(BACKEND_ENV_VAR, "text")
+    if backend == "text":
+        from note_storage import NoteStorage
+        return NoteStorage(filename or "notes.txt")
+    if backend == "sqlite":
+        from sqlite_storage import SQLiteNoteStorage
+        return SQLiteNoteStorage(filename or "notes.db")
+    if backend == "sharded":
+        from sharded_storage import ShardedNoteStorage
+        return ShardedNoteStorage(filename or "notes")
+    raise ValueError(f"Unknown storage backend: {backend}")
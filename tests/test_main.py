@@ -1,14 +1,50 @@
+import json
 import os
 import sys
 import unittest
 import tempfile
 import shutil
+import threading
+import time
+import multiprocessing
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest import mock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import file_lock
 from note_storage import NoteStorage
-from note_analyzer import NoteAnalyzer
+from note_parser import parse_timestamp
+from sqlite_storage import SQLiteNoteStorage
+from sharded_storage import ShardedNoteStorage
+from bulk_analysis import bulk_analyze
+from storage_backend import open_storage
+from group_commit import GroupCommitWriter
+from date_index import DateIndex
+from note_table import NoteTable
+from note_analyzer import AnalysisJob, NoteAnalyzer
+from analysis_cache import AnalysisCache
+from job_journal import JobJournal
+from analysis_store import AnalysisStore
 from backup_manager import BackupManager
+from snapshots import SnapshotStore
+from search_index import SearchIndex
+
+
+def _stress_worker(path, worker, count):
+    storage = NoteStorage(path)
+    kept = {}
+    for i in range(count):
+        content = f"worker {worker} note {i} " + "x" * (1 + i % 40)
+        note_id = storage.add_note(content, important=i % 2 == 0)
+        if i % 3 == 0:
+            storage.delete_note_by_id(note_id)
+        else:
+            kept[note_id] = content
+        if i % 20 == 0:
+            storage.compact_if_needed(0.2)
+    return kept
 
 
 class TestNoteStorage(unittest.TestCase):
@@ -67,6 +103,499 @@ class TestNoteStorage(unittest.TestCase):
         success = self.storage.delete_note(99)
         self.assertFalse(success)
 
+    def test_index_sidecar_persists_count(self):
+        self.storage.add_note("Note 1", important=False)
+        self.storage.add_note("Note 2", important=True)
+
+        self.assertTrue(os.path.exists(self.test_file + ".idx"))
+        reopened = NoteStorage(self.test_file)
+        self.assertEqual(reopened.get_note_count(), 2)
+        self.assertIn("Note 2", reopened.read_note_block(1))
+        self.assertIsNone(reopened.read_note_block(2))
+
+    def test_index_picks_up_external_append(self):
+        self.storage.add_note("Note 1", important=False)
+        with open(self.test_file, "a", encoding="utf-8") as f:
+            f.write("# Date: 2025-01-02 10:00:00\n# Note: External\n# Important: True\n# ----------------------------------\n")
+
+        self.assertEqual(self.storage.get_note_count(), 2)
+        self.assertIn("External", self.storage.read_note_block(1))
+
+    def test_delete_appends_tombstone(self):
+        self.storage.add_note("Note 1", important=False)
+        self.storage.add_note("Note 2", important=False)
+        size_before = os.path.getsize(self.test_file)
+
+        self.assertTrue(self.storage.delete_note(0))
+        self.assertGreater(os.path.getsize(self.test_file), size_before)
+
+        reopened = NoteStorage(self.test_file)
+        self.assertEqual(reopened.get_note_count(), 1)
+        self.assertIn("Note 2", reopened.read_notes_as_blocks()[0])
+
+    def test_compact_drops_deleted_notes(self):
+        for i in range(4):
+            self.storage.add_note(f"Note {i}", important=False)
+        self.storage.delete_note(1)
+        self.storage.delete_note(1)
+
+        self.assertFalse(self.storage.compact_if_needed(threshold=0.9))
+        self.assertTrue(self.storage.compact_if_needed(threshold=0.5))
+        self.assertEqual(self.storage.dead_ratio(), 0.0)
+
+        with open(self.test_file, encoding="utf-8") as f:
+            content = f.read()
+        self.assertNotIn("# Deleted:", content)
+        self.assertNotIn("Note 1", content)
+        self.assertEqual([b.count("Note 0") + b.count("Note 3") for b in self.storage.read_notes_as_blocks()], [1, 1])
+
+    def test_note_ids_are_stable(self):
+        first = self.storage.add_note("Note 1", important=False)
+        second = self.storage.add_note("Note 2", important=True)
+        self.assertEqual(second, first + 1)
+
+        self.assertTrue(self.storage.delete_note_by_id(first))
+        self.assertFalse(self.storage.delete_note_by_id(first))
+        self.assertIsNone(self.storage.get_note(first))
+
+        note = self.storage.get_note(second)
+        self.assertEqual(note["content"], "Note 2")
+        self.assertTrue(note["important"])
+        self.assertEqual(self.storage.get_notes_structured()[0]["id"], second)
+
+    def test_ids_not_reused_after_compaction(self):
+        self.storage.add_note("Note 1", important=False)
+        last = self.storage.add_note("Note 2", important=False)
+        self.storage.delete_note_by_id(last)
+        self.storage.compact()
+
+        self.assertGreater(NoteStorage(self.test_file).add_note("Note 3"), last)
+
+    def test_legacy_notes_get_ids_lazily(self):
+        with open(self.test_file, "w", encoding="utf-8") as f:
+            f.write("# Date: 2025-01-01 10:00:00\n# Note: Old A\n# Important: False\n# ----------------------------------\n")
+            f.write("# Date: 2025-01-01 11:00:00\n# Note: Old B\n# Important: True\n# ----------------------------------\n")
+
+        ids = [n["id"] for n in self.storage.get_notes_structured()]
+        self.assertEqual(ids, [1, 2])
+        self.storage.compact()
+
+        with open(self.test_file, encoding="utf-8") as f:
+            self.assertIn("# Id: 2\n# Date: 2025-01-01 11:00:00", f.read())
+        self.assertEqual(NoteStorage(self.test_file).get_note(2)["content"], "Old B")
+
+    def test_iter_notes_filters(self):
+        with open(self.test_file, "w", encoding="utf-8") as f:
+            for day, important in ((1, False), (2, True), (3, False), (4, True)):
+                f.write(f"# Date: 2025-01-0{day} 10:00:00\n# Note: Day {day}\n# Important: {important}\n# ----------------------------------\n")
+
+        self.assertEqual(len(list(self.storage.iter_notes())), 4)
+        self.assertEqual(
+            [n["content"] for n in self.storage.iter_notes(since=datetime(2025, 1, 2), until=datetime(2025, 1, 3, 23))],
+            ["Day 2", "Day 3"],
+        )
+        self.assertEqual([n["content"] for n in self.storage.iter_notes(important_only=True)], ["Day 2", "Day 4"])
+
+    def test_iter_notes_small_chunks(self):
+        for i in range(5):
+            self.storage.add_note(f"Note {i}")
+        self.storage.READ_CHUNK_SIZE = 16
+
+        self.assertEqual([n["content"] for n in self.storage.iter_notes()], [f"Note {i}" for i in range(5)])
+
+    def test_add_notes_bulk(self):
+        ids = self.storage.add_notes([("Bulk 1", False), ("Bulk 2", True), ("Bulk 3", False)])
+
+        self.assertEqual(ids, [1, 2, 3])
+        self.assertEqual(NoteStorage(self.test_file).get_note(2)["content"], "Bulk 2")
+        with self.assertRaises(ValueError):
+            self.storage.add_notes([("Ok", False), ("  ", False)])
+        self.assertEqual(self.storage.get_note_count(), 3)
+
+    def test_group_commit_acknowledges_each_note(self):
+        writer = GroupCommitWriter(self.storage, policy=GroupCommitWriter.COUNT, batch_size=5, interval_ms=50)
+        writer.start()
+        futures = []
+        lock = threading.Lock()
+
+        def produce(worker):
+            for i in range(10):
+                future = writer.submit(f"Worker {worker} note {i}")
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=produce, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.stop()
+
+        ids = [f.result(timeout=1) for f in futures]
+        self.assertEqual(len(set(ids)), 40)
+        self.assertEqual(self.storage.get_note_count(), 40)
+        self.assertEqual(self.storage.get_note(ids[0])["id"], ids[0])
+
+    def _record_batches(self):
+        batches = []
+        add_notes = self.storage.add_notes
+
+        def recording(notes, fsync=False):
+            notes = list(notes)
+            batches.append(len(notes))
+            return add_notes(notes, fsync)
+
+        self.storage.add_notes = recording
+        return batches
+
+    def test_interval_policy_flushes_on_time_only(self):
+        batches = self._record_batches()
+        writer = GroupCommitWriter(self.storage, policy=GroupCommitWriter.INTERVAL, batch_size=2, interval_ms=200)
+        writer.start()
+        futures = [writer.submit(f"Note {i}") for i in range(5)]
+        for future in futures:
+            future.result(timeout=2)
+        writer.stop()
+        self.assertEqual(batches, [5])
+
+    def test_count_policy_waits_for_a_full_batch(self):
+        batches = self._record_batches()
+        writer = GroupCommitWriter(self.storage, policy=GroupCommitWriter.COUNT, batch_size=2, interval_ms=1,
+                                   max_latency_ms=5000)
+        writer.start()
+        futures = [writer.submit(f"Note {i}") for i in range(5)]
+        for future in futures[:4]:
+            future.result(timeout=2)
+        time.sleep(0.1)
+        self.assertFalse(futures[4].done())
+        writer.stop()
+        self.assertEqual(batches, [2, 2, 1])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_concurrent_processes_lose_no_notes(self):
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(4) as pool:
+            results = pool.starmap(_stress_worker, [(self.test_file, w, 60) for w in range(4)])
+
+        expected = {}
+        for kept in results:
+            self.assertFalse(set(kept) & set(expected))
+            expected.update(kept)
+
+        os.remove(self.test_file + ".idx")
+        notes = {n["id"]: n["content"] for n in NoteStorage(self.test_file).iter_notes()}
+        self.assertEqual(notes, expected)
+        self.assertEqual(self.storage.get_note_count(), len(expected))
+
+    def test_mmap_parser_matches_lines_parser(self):
+        self.storage.add_note("Prvni poznamka", important=True)
+        self.storage.add_note("Druhá # Important: False", important=False)
+        with open(self.test_file, "a", encoding="utf-8") as f:
+            f.write("# Date: 2025-01-01\n# Note: Bad date\n# Important: False\n# ----------------------------------\n")
+
+        mmap_storage = NoteStorage(self.test_file, parser="mmap")
+        self.assertEqual(
+            [dict(n) for n in mmap_storage.get_notes_structured()],
+            self.storage.get_notes_structured(),
+        )
+
+    def test_date_only_timestamps_fall_in_their_day(self):
+        with open(self.test_file, "a", encoding="utf-8") as f:
+            f.write("# Date: 2025-01-01\n# Note: Stara\n# Important: False\n# ----------------------------------\n")
+        self.storage.add_note("Nova", important=False)
+
+        def contents(since, until):
+            return [n["content"] for n in self.storage.iter_notes(since=since, until=until)]
+
+        self.assertEqual(contents(datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59, 59)), ["Stara"])
+        self.assertEqual(contents(None, datetime(2024, 12, 31, 23, 59, 59)), [])
+
+    def test_iteration_ignores_notes_added_meanwhile(self):
+        self.storage.add_note("Prvni", important=False)
+        self.storage.add_note("Druha", important=False)
+        for parser in NoteStorage.PARSERS:
+            storage = NoteStorage(self.test_file, parser=parser)
+            expected = [n["content"] for n in storage.iter_notes()]
+            notes = storage.iter_notes()
+            first = next(notes)["content"]
+            storage.add_note(f"Pridana {parser}", important=False)
+            self.assertEqual([first] + [n["content"] for n in notes], expected)
+
+    def test_mmap_notes_outlive_the_map(self):
+        first = self.storage.add_note("Prvni", important=False)
+        self.storage.add_note("Druha", important=False)
+        mmap_storage = NoteStorage(self.test_file, parser="mmap")
+
+        notes = mmap_storage.iter_notes()
+        note = next(notes)
+        notes.close()
+        self.assertIsInstance(note._raw, bytes)
+        self.storage.delete_note_by_id(first)
+        self.storage.compact()
+
+        self.assertEqual(note["content"], "Prvni")
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp(b"2025-12-01 16:34:03"), datetime(2025, 12, 1, 16, 34, 3))
+        self.assertIsNone(parse_timestamp(b"2025-01-01"))
+        self.assertIsNone(parse_timestamp(b"2025-13-01 16:34:03"))
+
+
+class TestFileLock(unittest.TestCase):
+
+    def test_msvcrt_lock_is_taken_once_per_outermost_acquire(self):
+        held = set()
+
+        def locking(fd, mode, nbytes):
+            if mode == fake.LK_UNLCK:
+                held.remove(fd)
+            elif fd in held:
+                raise OSError("deadlock")
+            else:
+                held.add(fd)
+
+        fake = SimpleNamespace(LK_LOCK=1, LK_UNLCK=0, locking=locking)
+        test_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.multiple(file_lock, fcntl=None, msvcrt=fake):
+                storage = NoteStorage(os.path.join(test_dir, "notes.txt"))
+                storage.add_note("Ahoj")
+                self.assertEqual(NoteStorage(storage.filename).get_note_count(), 1)
+            self.assertEqual(held, set())
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class TestSQLiteNoteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.test_dir, "notes.db")
+        self.storage = SQLiteNoteStorage(self.db_file)
+
+    def tearDown(self):
+        self.storage.close()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_add_and_delete(self):
+        first = self.storage.add_note("Note 1", important=False)
+        second = self.storage.add_note("Note 2", important=True)
+
+        self.assertEqual(self.storage.get_note_count(), 2)
+        self.assertTrue(self.storage.delete_note(0))
+        self.assertFalse(self.storage.delete_note_by_id(first))
+        self.assertEqual(self.storage.get_note(second)["content"], "Note 2")
+        self.assertEqual([n["index"] for n in self.storage.get_notes_structured()], [0])
+
+    def test_filters_and_wal(self):
+        self.storage.add_note("Normal", important=False)
+        self.storage.add_note("Urgent", important=True)
+
+        self.assertEqual([n["content"] for n in self.storage.iter_notes(important_only=True)], ["Urgent"])
+        mode = self.storage._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode.lower(), "wal")
+
+        self.storage.add_notes([("Durable", False)], fsync=True)
+        self.assertEqual(self.storage._conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+
+    def test_import_and_export_round_trip(self):
+        text_file = os.path.join(self.test_dir, "notes.txt")
+        text_storage = NoteStorage(text_file)
+        text_storage.add_note("Prvni", important=True)
+        kept = text_storage.add_note("Druha", important=False)
+        text_storage.delete_note(0)
+
+        self.assertEqual(self.storage.import_from_text(text_file), 1)
+        self.assertEqual(self.storage.get_note(kept)["content"], "Druha")
+
+        exported = os.path.join(self.test_dir, "exported.txt")
+        self.assertEqual(self.storage.export_to_text(exported), 1)
+        round_trip = NoteStorage(exported)
+        self.assertEqual(round_trip.get_note(kept)["content"], "Druha")
+        self.assertGreater(round_trip.add_note("Treti"), kept)
+
+    def test_import_keeps_date_only_stamps(self):
+        text_file = os.path.join(self.test_dir, "notes.txt")
+        with open(text_file, "w", encoding="utf-8") as f:
+            f.write("# Id: 1\n# Date: 2025-01-01\n# Note: Stara\n# Important: False\n# ----------------------------------\n")
+
+        self.storage.import_from_text(text_file)
+
+        self.assertEqual(self.storage.get_note(1)["datetime"], datetime(2025, 1, 1))
+
+    def test_open_storage_selects_backend(self):
+        self.assertIsInstance(open_storage("text", os.path.join(self.test_dir, "a.txt")), NoteStorage)
+        other = open_storage("sqlite", os.path.join(self.test_dir, "b.db"))
+        self.assertIsInstance(other, SQLiteNoteStorage)
+        other.close()
+        with self.assertRaises(ValueError):
+            open_storage("csv")
+
+
+class TestShardedNoteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.text_file = os.path.join(self.test_dir, "notes.txt")
+        with open(self.text_file, "w", encoding="utf-8") as f:
+            for note_id, stamp, content in ((1, "2025-12-30 10:00:00", "Prosinec"), (2, "", "Bez data"),
+                                            (3, "2026-01-02 09:00:00", "Leden jedna"),
+                                            (4, "2026-01-20 18:30:00", "Leden dva")):
+                f.write(f"# Id: {note_id}\n# Date: {stamp}\n# Note: {content}\n# Important: {note_id == 3}\n"
+                        "# ----------------------------------\n")
+        self.directory = os.path.join(self.test_dir, "notes")
+        self.storage = ShardedNoteStorage(self.directory, workers=2)
+        self.storage.PARALLEL_MIN_BYTES = 0
+        self.assertEqual(self.storage.import_from_text(self.text_file), 4)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_import_splits_by_month(self):
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [".lock", "2025-12.txt", "2026-01.txt", "next-id", "undated.txt"])
+        notes = self.storage.get_notes_structured()
+        self.assertEqual([(n["index"], n["id"]) for n in notes], [(0, 2), (1, 1), (2, 3), (3, 4)])
+        self.assertEqual([dict(n) for n in self.storage.iter_notes()], notes)
+
+        january = list(self.storage.iter_notes(since=datetime(2026, 1, 1), until=datetime(2026, 1, 31)))
+        self.assertEqual([(n["index"], n["content"]) for n in january], [(None, "Leden jedna"), (None, "Leden dva")])
+
+    def test_import_keeps_date_only_stamps(self):
+        text_file = os.path.join(self.test_dir, "legacy.txt")
+        with open(text_file, "w", encoding="utf-8") as f:
+            f.write("# Id: 1\n# Date: 2025-01-01\n# Note: Stara\n# Important: False\n# ----------------------------------\n")
+        storage = ShardedNoteStorage(os.path.join(self.test_dir, "legacy"), workers=1)
+
+        storage.import_from_text(text_file)
+
+        january = storage.iter_notes(since=datetime(2025, 1, 1), until=datetime(2025, 1, 31, 23, 59, 59))
+        self.assertEqual([(n["id"], n["datetime"]) for n in january], [(1, datetime(2025, 1, 1))])
+
+    def test_add_and_delete_route_to_one_month(self):
+        note_id = self.storage.add_note("Dnesni", important=True)
+        self.assertEqual(note_id, 5)
+        month_file = os.path.join(self.directory, datetime.now().strftime("%Y-%m.txt"))
+        self.assertEqual(NoteStorage(month_file).get_note(note_id)["content"], "Dnesni")
+
+        reopened = ShardedNoteStorage(self.directory)
+        self.assertTrue(reopened.delete_note_by_id(3))
+        self.assertFalse(reopened.delete_note_by_id(3))
+        self.assertTrue(reopened.delete_note(0))
+        self.assertEqual([n["id"] for n in reopened.iter_notes()], [1, 4, 5])
+        self.assertEqual(reopened.add_note("Dalsi"), 6)
+
+    def test_small_scans_skip_the_pool_and_large_ones_reuse_it(self):
+        small = ShardedNoteStorage(self.directory, workers=2)
+        self.assertEqual(len(small.get_notes_structured()), 4)
+        self.assertIsNone(small._pool)
+
+        self.storage.get_notes_structured()
+        pool = self.storage._pool
+        self.assertIsNotNone(pool)
+        self.assertEqual(len(self.storage.get_notes_structured()), 4)
+        self.assertIs(self.storage._pool, pool)
+
+    def test_parallel_bulk_analysis_and_export(self):
+        summary = bulk_analyze(self.storage, results=self.storage.analysis_results())
+        self.assertEqual((summary.notes, summary.words, summary.important), (4, 7, 1))
+        self.assertEqual(self.storage.analysis_results().get(4)["words"], 2)
+
+        exported = os.path.join(self.test_dir, "exported.txt")
+        self.assertEqual(self.storage.export_to_text(exported), 4)
+        self.assertEqual([n["content"] for n in NoteStorage(exported).iter_notes()],
+                         ["Bez data", "Prosinec", "Leden jedna", "Leden dva"])
+        with self.assertRaises(ValueError):
+            self.storage.import_from_text(exported)
+
+
+class TestNoteTable(unittest.TestCase):
+
+    def test_rows_read_like_dicts(self):
+        notes = [
+            {"index": i, "id": i + 1, "datetime": datetime(2026, 1, 1 + i, 8, 30, 5), "content": f"poznámka {i}",
+             "important": i % 3 == 0}
+            for i in range(10)
+        ]
+        notes.append({"index": None, "id": 42, "datetime": None, "content": "", "important": True})
+        table = NoteTable(notes)
+
+        self.assertEqual(len(table), 11)
+        self.assertEqual(table, notes)
+        self.assertEqual(table[3]["content"], "poznámka 3")
+        self.assertEqual(table[-1].datetime, None)
+        self.assertEqual(table[-1]["index"], None)
+        self.assertEqual([n["important"] for n in table[8:]], [False, True, True])
+        self.assertNotIn("analysis", table[0])
+        with self.assertRaises(IndexError):
+            table[11]
+
+    def test_storage_returns_table_with_analysis(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            storage = NoteStorage(os.path.join(test_dir, "notes.txt"))
+            note_id = storage.add_note("jedna dva", important=True)
+            table = storage.get_notes_structured(with_analysis=True)
+            self.assertIsInstance(table, NoteTable)
+            self.assertEqual(dict(table[0]), dict(storage.get_note(note_id), index=0, analysis=None))
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class TestDateIndex(unittest.TestCase):
+
+    def _note(self, note_id, dt_val):
+        return {"id": note_id, "datetime": dt_val, "content": f"Note {note_id}", "important": False}
+
+    def test_month_and_day_lookup(self):
+        index = DateIndex([
+            self._note(1, datetime(2025, 12, 1, 16, 35)),
+            self._note(2, datetime(2025, 12, 1, 9, 0)),
+            self._note(3, datetime(2026, 1, 5, 12, 0)),
+            self._note(4, None),
+        ])
+
+        self.assertEqual(len(index), 3)
+        self.assertEqual(sorted(index.month(2025, 12)), [1])
+        self.assertEqual([n["id"] for n in index.day(2025, 12, 1)], [2, 1])
+        self.assertEqual(index.month(2024, 1), {})
+
+    def test_incremental_add_and_remove(self):
+        index = DateIndex([self._note(1, datetime(2025, 12, 1, 10, 0))])
+        index.add(self._note(2, datetime(2025, 12, 1, 8, 0)))
+
+        self.assertEqual([n["id"] for n in index.day(2025, 12, 1)], [2, 1])
+        self.assertTrue(index.remove(1))
+        self.assertFalse(index.remove(1))
+        self.assertTrue(index.remove(2))
+        self.assertEqual(index.month(2025, 12), {})
+
+    def test_keeps_note_table_rows(self):
+        table = NoteTable([
+            dict(self._note(1, datetime(2025, 12, 1, 16, 35)), index=0),
+            dict(self._note(2, None), index=1),
+            dict(self._note(3, datetime(2025, 12, 1, 9, 0)), index=2),
+        ])
+        index = DateIndex(table)
+        index.add(self._note(4, datetime(2025, 12, 1, 12, 0)))
+
+        self.assertIs(index._table, table)
+        self.assertEqual(index._months, {(2025, 12): {1: [2, 3, 0]}})
+        self.assertEqual([n.content for n in index.day(2025, 12, 1)], ["Note 3", "Note 4", "Note 1"])
+
+    def test_set_month_replaces_only_that_month(self):
+        index = DateIndex([self._note(1, datetime(2025, 12, 1, 10, 0)), self._note(2, datetime(2026, 1, 5, 8, 0))])
+        self.assertFalse(index.has_month(2025, 12))
+
+        index.set_month(2025, 12, [self._note(3, datetime(2025, 12, 2, 9, 0))])
+
+        self.assertTrue(index.has_month(2025, 12))
+        self.assertEqual(sorted(index.month(2025, 12)), [2])
+        self.assertIsNone(index.day_of(1))
+        self.assertEqual(index.day_of(2), (2026, 1, 5))
+
 
 class TestNoteAnalyzer(unittest.TestCase):
     
@@ -81,6 +610,15 @@ class TestNoteAnalyzer(unittest.TestCase):
         if os.path.exists(self.test_dir):
             shutil.rmtree(self.test_dir)
     
+    def test_backfill_queues_stored_notes(self):
+        storage = NoteStorage(os.path.join(self.test_dir, "notes.txt"))
+        storage.add_note("Normal", important=False)
+        storage.add_note("Urgent", important=True)
+
+        self.assertEqual(self.analyzer.backfill(storage, important_only=True), 1)
+        job = self.analyzer.analysis_queue.get_nowait()[2]
+        self.assertEqual((job.content, job.important, job.note_id), ("Urgent", True, 2))
+
     def test_analyzer_starts_and_stops(self):
         self.assertFalse(self.analyzer._running)
         self.analyzer.start()
@@ -88,6 +626,432 @@ class TestNoteAnalyzer(unittest.TestCase):
         self.analyzer.stop()
         self.assertFalse(self.analyzer._running)
 
+    def _log_lines(self):
+        with open(self.log_file) as f:
+            return f.read().splitlines()
+
+    def test_worker_pool_drains_on_stop(self):
+        self.analyzer = NoteAnalyzer(self.log_file, workers=4, analysis_seconds=0.05)
+        self.analyzer.start()
+        for i in range(8):
+            self.analyzer.analyze_note(f"note {i}", False)
+        self.analyzer.stop()
+
+        self.assertEqual(len(self._log_lines()), 8)
+        self.assertFalse(any(t.is_alive() for t in threading.enumerate() if t.name.startswith("Analyzer-Thread")))
+
+    def test_drop_policy_counts_rejected_notes(self):
+        self.analyzer = NoteAnalyzer(self.log_file, max_queue_size=2, overflow=NoteAnalyzer.DROP)
+        results = [self.analyzer.analyze_note(f"note {i}", False) for i in range(5)]
+
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(self.analyzer.dropped, 3)
+
+    def test_spill_policy_analyzes_every_note_in_order(self):
+        self.analyzer = NoteAnalyzer(self.log_file, max_queue_size=2, overflow=NoteAnalyzer.SPILL,
+                                     analysis_seconds=0)
+        for i in range(6):
+            self.assertTrue(self.analyzer.analyze_note(f"note{i}", False))
+        self.assertEqual(self.analyzer.spilled, 4)
+
+        self.analyzer.start()
+        self.analyzer.stop()
+
+        self.assertEqual([line.split("'")[1] for line in self._log_lines()],
+                         [f"note{i}..." for i in range(6)])
+        self.assertFalse(os.path.exists(self.analyzer.spill_file))
+
+    def test_torn_spill_line_is_skipped(self):
+        spill_file = self.log_file + ".spill"
+        with open(spill_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps(AnalysisJob("a", False)) + "\n" + '["b", fal')
+
+        self.analyzer = NoteAnalyzer(self.log_file, max_queue_size=2, overflow=NoteAnalyzer.SPILL,
+                                     analysis_seconds=0)
+        self.analyzer.start()
+        for note in ("c", "d", "e"):
+            self.analyzer.analyze_note(note, False)
+        self.analyzer.stop()
+
+        self.assertEqual(sorted(line.split("'")[1] for line in self._log_lines()), ["a...", "c...", "d...", "e..."])
+
+    def test_urgent_note_is_not_spilled_behind_normal_ones(self):
+        self.analyzer = NoteAnalyzer(self.log_file, max_queue_size=2, overflow=NoteAnalyzer.SPILL,
+                                     analysis_seconds=0)
+        for i in range(4):
+            self.analyzer.analyze_note(f"normal{i}", False)
+        self.assertTrue(self.analyzer.analyze_note("URGENT", True))
+
+        with open(self.analyzer.spill_file, "r", encoding="utf-8") as f:
+            spilled = [json.loads(line)[0] for line in f]
+        self.assertEqual(spilled, ["normal2", "normal3", "normal1"])
+
+        self.analyzer.start()
+        self.analyzer.stop()
+        analyzed = [line.split("'")[1] for line in self._log_lines()]
+        self.assertEqual(analyzed[0], "URGENT...")
+        self.assertEqual(sorted(analyzed[1:]), [f"normal{i}..." for i in range(4)])
+
+    def test_reanalyze_writes_log_and_day_totals(self):
+        storage = NoteStorage(os.path.join(self.test_dir, "notes.txt"))
+        with open(storage.filename, "w", encoding="utf-8") as f:
+            for stamp, content, important in [("2025-12-01 08:00:00", "one two", True),
+                                              ("2025-12-01 09:00:00", "three", False),
+                                              ("2025-12-02 10:00:00", "four five six", False)]:
+                f.write(f"# Date: {stamp}\n# Note: {content}\n# Important: {important}\n"
+                        "# ----------------------------------\n")
+
+        summary = self.analyzer.reanalyze(storage)
+
+        self.assertEqual((summary.notes, summary.words, summary.important), (3, 6, 1))
+        self.assertEqual(summary.per_day[date(2025, 12, 1)], (2, 3, 1))
+        self.assertEqual(summary.per_day[date(2025, 12, 2)], (1, 3, 0))
+        self.assertEqual(len(self._log_lines()), 3)
+
+    def _queued_order(self):
+        order = []
+        while not self.analyzer.analysis_queue.empty():
+            order.append(self.analyzer.analysis_queue.get_nowait()[2].content)
+        return order
+
+    def test_urgent_notes_jump_recent_normal_notes_only(self):
+        self.analyzer = NoteAnalyzer(self.log_file, urgent_boost_seconds=30)
+        self.analyzer.analysis_queue.put(self.analyzer._entry(AnalysisJob("old normal", False, None, time.time() - 60)))
+        self.analyzer.analyze_note("normal", False)
+        self.analyzer.analyze_note("urgent", True)
+        self.analyzer.analyze_note("due soon", False, deadline_seconds=1)
+
+        self.assertEqual(self._queued_order(), ["old normal", "urgent", "due soon", "normal"])
+
+    def test_latency_percentiles_per_priority(self):
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0)
+        for i in range(4):
+            self.analyzer.analyze_note(f"normal {i}", False)
+        self.analyzer.analyze_note("urgent", True, deadline_seconds=60)
+        self.analyzer.start()
+        self.analyzer.stop()
+
+        stats = self.analyzer.latency_percentiles((50, 99))
+        self.assertEqual(set(stats), {"URGENT", "Normal"})
+        self.assertLessEqual(stats["URGENT"]["wait"][99], stats["Normal"]["wait"][99])
+        self.assertGreaterEqual(stats["Normal"]["total"][50], stats["Normal"]["wait"][50])
+        self.assertEqual(self.analyzer.missed_deadlines, 0)
+
+    def test_journal_replays_unfinished_jobs_after_crash(self):
+        journal_path = os.path.join(self.test_dir, "jobs.journal")
+        journal = JobJournal(journal_path)
+        crashed = NoteAnalyzer(self.log_file, analysis_seconds=0, journal=journal)
+        crashed.analyze_note("lost one", False)
+        crashed.analyze_note("lost two", True)
+        journal.close()
+
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0, journal=JobJournal(journal_path))
+        self.analyzer.start()
+        self.analyzer.stop()
+
+        self.assertEqual(sorted(line.split("'")[1] for line in self._log_lines()), ["lost one...", "lost two..."])
+        self.assertEqual(len(JobJournal(journal_path)), 0)
+        self.assertEqual(os.path.getsize(journal_path), 0)
+
+    def test_recovered_backlog_does_not_block_start(self):
+        journal_path = os.path.join(self.test_dir, "jobs.journal")
+        journal = JobJournal(journal_path)
+        for i in range(20):
+            journal.record(AnalysisJob(f"lost {i}", False))
+        journal.close()
+
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0.02, max_queue_size=2,
+                                     journal=JobJournal(journal_path))
+        started = time.perf_counter()
+        self.analyzer.start()
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.analyzer.stop()
+
+        self.assertEqual(len(self._log_lines()), 20)
+
+    def test_journal_marks_jobs_done_only_after_log_flush(self):
+        journal = JobJournal(os.path.join(self.test_dir, "jobs.journal"))
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0, journal=journal,
+                                     log_batch_size=1000, log_interval_ms=60000)
+        self.analyzer.start()
+        self.analyzer.analyze_note("queued but not yet logged", False)
+        self.analyzer.analysis_queue.join()
+        self.assertEqual(len(journal), 1)
+
+        self.analyzer.stop()
+        self.assertEqual(len(journal), 0)
+
+    def test_journal_keeps_failed_jobs_open(self):
+        journal = JobJournal(os.path.join(self.test_dir, "jobs.journal"))
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0, journal=journal)
+
+        def fail(*args):
+            raise OSError("disk full")
+
+        self.analyzer._analyze = fail
+        self.analyzer.analyze_note("will fail", False)
+        self.analyzer.start()
+        self.analyzer.stop()
+        self.assertEqual(len(journal), 1)
+
+    def test_jsonl_log_format(self):
+        self.analyzer = NoteAnalyzer(self.log_file, analysis_seconds=0, log_format="jsonl")
+        self.analyzer.start()
+        self.analyzer.analyze_note("three word note", True)
+        self.analyzer.stop()
+
+        record = json.loads(self._log_lines()[0])
+        self.assertEqual((record["preview"], record["words"], record["priority"]), ("three word", 3, "URGENT"))
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.storage = NoteStorage(os.path.join(self.test_dir, "notes.txt"))
+        self.ids = self.storage.add_notes([
+            ("Zavolat do školy kvůli úkolu", False),
+            ("Úkol: koupit mléko a chléb", True),
+            ("koupit dárek, potom úkol z matematiky", False),
+            ("Schůzka v práci", False),
+        ])
+        self.index = SearchIndex(self.storage)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.test_dir)
+
+    def _ids(self, query):
+        return [hit.note_id for hit in self.index.search(query)]
+
+    def test_diacritic_insensitive_terms_all_match(self):
+        self.assertEqual(sorted(self._ids("UKOL")), [self.ids[1], self.ids[2]])
+        self.assertEqual(self._ids("ukol mleko"), [self.ids[1]])
+        self.assertEqual(self._ids("skoly"), [self.ids[0]])
+
+    def test_prefix_and_phrase_queries(self):
+        self.assertEqual(sorted(self._ids("uko*")), [self.ids[0], self.ids[1], self.ids[2]])
+        self.assertEqual(self._ids('"koupit mleko"'), [self.ids[1]])
+        self.assertEqual(self._ids('"mleko koupit"'), [])
+
+    def test_bm25_prefers_shorter_note(self):
+        self.assertEqual(self._ids("koupit"), [self.ids[1], self.ids[2]])
+
+    def test_index_follows_adds_and_deletes(self):
+        self.index.build()
+        new_id = self.storage.add_note("Nový úkol na zítra", important=False)
+        self.assertIn(new_id, self._ids("zitra"))
+
+        self.storage.delete_note_by_id(self.ids[1])
+        self.assertEqual(self._ids("mleko"), [])
+
+
+class TestJobJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "jobs.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_compacts_to_pending_jobs(self):
+        journal = JobJournal(self.path, compact_after=10)
+        seqs = [journal.record(["note", False]) for _ in range(20)]
+        for seq in seqs[:-1]:
+            journal.done(seq)
+        journal.close()
+
+        with open(self.path) as f:
+            self.assertLess(len(f.readlines()), 10)
+        self.assertEqual(JobJournal(self.path).take_recovered(), [(seqs[-1], ["note", False])])
+
+    def test_ignores_torn_last_line(self):
+        journal = JobJournal(self.path)
+        first = journal.record(["kept", False])
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"op": "add", "se')
+
+        reopened = JobJournal(self.path)
+        second = reopened.record(["after crash", True])
+        reopened.close()
+
+        self.assertEqual(JobJournal(self.path).take_recovered(),
+                         [(first, ["kept", False]), (second, ["after crash", True])])
+
+
+class TestAnalysisCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_hits_and_misses_depend_on_content_and_importance(self):
+        cache = AnalysisCache()
+        cache.put("ukol", False, {"words": 1})
+
+        self.assertEqual(cache.get("ukol", False), {"words": 1})
+        self.assertIsNone(cache.get("ukol", True))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction_and_ttl(self):
+        cache = AnalysisCache(max_entries=2)
+        cache.put("a", False, {})
+        cache.put("b", False, {})
+        cache.get("a", False)
+        cache.put("c", False, {})
+        self.assertIsNone(cache.get("b", False))
+        self.assertIsNotNone(cache.get("a", False))
+
+        expired = AnalysisCache(ttl_seconds=0)
+        expired.put("a", False, {})
+        time.sleep(0.01)
+        self.assertIsNone(expired.get("a", False))
+
+    def test_persists_across_instances(self):
+        cache = AnalysisCache(path=self.path)
+        cache.put("ukol", True, {"words": 1})
+        cache.save()
+
+        self.assertEqual(AnalysisCache(path=self.path).get("ukol", True), {"words": 1})
+
+    def test_analyzer_uses_cache(self):
+        cache = AnalysisCache()
+        analyzer = NoteAnalyzer(os.path.join(self.test_dir, "log.txt"), analysis_seconds=0, cache=cache)
+        analyzer.start()
+        for _ in range(3):
+            analyzer.analyze_note("ukol", False)
+        analyzer.stop()
+
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_analyzer_hits_do_not_extend_ttl(self):
+        cache = AnalysisCache(ttl_seconds=60)
+        analyzer = NoteAnalyzer(os.path.join(self.test_dir, "log.txt"), analysis_seconds=0, cache=cache)
+        cache.put("ukol", False, {"words": 1, "priority": "Normal"})
+        stored_at = next(iter(cache._entries.values()))[0]
+        time.sleep(0.01)
+        analyzer.start()
+        for _ in range(2):
+            analyzer.analyze_note("ukol", False)
+        analyzer.stop()
+
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(next(iter(cache._entries.values()))[0], stored_at)
+
+
+class TestAnalysisStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.storage = NoteStorage(os.path.join(self.test_dir, "notes.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_results_persist_and_last_write_wins(self):
+        results = self.storage.analysis_results()
+        results.put(1, {"words": 2, "priority": "Normal"})
+        results.put(1, {"words": 5, "priority": "URGENT"})
+
+        reopened = AnalysisStore(results.path)
+        self.assertEqual(reopened.get(1), {"words": 5, "priority": "URGENT"})
+        self.assertEqual(len(reopened), 1)
+
+    def test_deleted_notes_drop_their_results(self):
+        ids = [self.storage.add_note(f"note {i}") for i in range(3)]
+        results = self.storage.analysis_results()
+        results.put_many((note_id, {"words": 2, "important": False}) for note_id in ids)
+
+        self.assertTrue(self.storage.delete_note_by_id(ids[0]))
+
+        self.assertEqual(results.ids_where(min_words=1), {ids[1], ids[2]})
+        self.assertIsNone(results.get(ids[0]))
+        reopened = AnalysisStore(results.path)
+        self.assertEqual(reopened.ids_where(min_words=1), {ids[1], ids[2]})
+        reopened.compact()
+        self.assertEqual(len(AnalysisStore(results.path)), 2)
+        self.assertEqual(reopened.get(ids[2]), {"words": 2, "priority": "Normal"})
+
+    def test_refresh_sees_other_writers(self):
+        reader = AnalysisStore(os.path.join(self.test_dir, "notes.txt.analysis"))
+        AnalysisStore(reader.path).put(7, {"words": 3, "important": False})
+
+        self.assertIsNone(reader.get(7))
+        reader.refresh()
+        self.assertEqual(reader.get(7), {"words": 3, "priority": "Normal"})
+
+    def test_analyzer_results_filter_structured_notes(self):
+        short_id = self.storage.add_note("short", important=False)
+        long_id = self.storage.add_note("a much longer note", important=True)
+        self.storage.add_note("not analysed yet", important=False)
+
+        analyzer = NoteAnalyzer(os.path.join(self.test_dir, "log.txt"), analysis_seconds=0,
+                                results=self.storage.analysis_results())
+        analyzer.start()
+        analyzer.analyze_note("short", False, short_id)
+        analyzer.analyze_note("a much longer note", True, long_id)
+        analyzer.stop()
+
+        notes = self.storage.get_notes_structured(with_analysis=True)
+        self.assertEqual([n["analysis"] and n["analysis"]["words"] for n in notes], [1, 4, None])
+        self.assertEqual([n["id"] for n in self.storage.get_notes_structured(min_words=2)], [long_id])
+        self.assertEqual([n["id"] for n in self.storage.get_notes_structured(priority="Normal")], [short_id])
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = SnapshotStore(os.path.join(self.test_dir, "snapshots"), keep_last=2, keep_hourly=2,
+                                   keep_daily=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _snapshot(self, data, when):
+        source = os.path.join(self.test_dir, "notes.txt")
+        with open(source, "wb") as f:
+            f.write(data)
+        with open(source, "rb") as f:
+            return self.store.create(f, now=when)
+
+    def test_directory_is_created_by_first_snapshot(self):
+        directory = os.path.join(self.test_dir, "snapshots")
+        self.assertEqual((self.store.list(), self.store.prune()), ([], []))
+        self.assertFalse(os.path.exists(directory))
+
+        self._snapshot(b"# Note: hello\n", datetime(2026, 1, 1, 12))
+        self.assertTrue(os.path.isdir(directory))
+
+    def test_create_verify_and_restore(self):
+        entry = self._snapshot(b"# Note: hello\n" * 100, datetime(2026, 1, 1, 12))
+        self.assertLess(entry["stored_size"], entry["size"])
+        self.assertTrue(self.store.verify(entry["name"]))
+
+        target = os.path.join(self.test_dir, "restored.txt")
+        self.store.restore(entry["name"], target)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"# Note: hello\n" * 100)
+
+        with open(os.path.join(self.store.directory, entry["name"]), "ab") as f:
+            f.write(b"garbage")
+        self.assertFalse(self.store.verify(entry["name"]))
+
+    def test_retention_keeps_last_hourly_and_daily(self):
+        times = [datetime(2026, 1, 1, 10, 0), datetime(2026, 1, 2, 9, 0), datetime(2026, 1, 2, 9, 30),
+                 datetime(2026, 1, 2, 10, 0), datetime(2026, 1, 2, 10, 10), datetime(2026, 1, 2, 10, 20)]
+        names = [self._snapshot(str(i).encode(), when)["name"] for i, when in enumerate(times)]
+
+        kept = [e["name"] for e in self.store.list()]
+        # last two, newest of hours 09 and 10 on the 2nd, newest of the 1st and the 2nd
+        self.assertEqual(kept, [names[0], names[2], names[4], names[5]])
+        self.assertEqual(sorted(os.listdir(self.store.directory)), sorted(kept + ["manifest.json"]))
+
 
 class TestBackupManager(unittest.TestCase):
     
@@ -126,6 +1090,200 @@ class TestBackupManager(unittest.TestCase):
             content = f.read()
         self.assertEqual(content, "test content")
 
+    # The first note is as much longer than the last as the "# Next-Id:" block compaction writes,
+    # so the compacted file ends exactly where a block of the restored one does.
+    ALPHA = "alpha " + "a" * 49
+
+    def _compacted_after_backup(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_notes([(self.ALPHA, False), ("beta x", False), ("gamma", False)])
+        self.backup_manager.create_backup_now()
+        storage.delete_note_by_id(1)
+        storage.compact()
+        self.assertEqual(len(NoteStorage(self.source_file).get_notes_structured()), 2)
+
+    def test_restore_discards_stale_index(self):
+        self._compacted_after_backup()
+        self.backup_manager.restore()
+
+        notes = NoteStorage(self.source_file).get_notes_structured()
+        self.assertEqual([(n["id"], n["content"]) for n in notes], [(1, self.ALPHA), (2, "beta x"), (3, "gamma")])
+
+    def test_index_notices_notes_file_replaced_from_outside(self):
+        self._compacted_after_backup()
+        shutil.copy(self.backup_file, self.source_file)
+
+        notes = NoteStorage(self.source_file).get_notes_structured()
+        self.assertEqual([(n["id"], n["content"]) for n in notes], [(1, self.ALPHA), (2, "beta x"), (3, "gamma")])
+
+    def test_notes_can_be_added_while_backup_copies(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("Before", important=False)
+        write_snapshot = self.backup_manager._write_snapshot
+        writers = []
+
+        def slow_snapshot(*args):
+            writer = threading.Thread(target=storage.add_note, args=("During", False))
+            writer.start()
+            writer.join(timeout=5)
+            writers.append(writer)
+            write_snapshot(*args)
+
+        self.backup_manager._write_snapshot = slow_snapshot
+        self.assertTrue(self.backup_manager.create_backup_now())
+
+        self.assertFalse(writers[0].is_alive())
+        with open(self.backup_file, "r", encoding="utf-8") as f:
+            backup = f.read()
+        self.assertIn("Before", backup)
+        self.assertNotIn("During", backup)
+
+    def test_verify_backup(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("First", important=False)
+        self.backup_manager.create_backup_now()
+        self.assertTrue(self.backup_manager.verify_backup())
+
+        storage.add_note("Second", important=False)
+        self.assertFalse(self.backup_manager.verify_backup())
+        self.assertFalse(os.path.exists(self.backup_file + ".idx"))
+        self.assertFalse(os.path.exists(self.backup_file + ".lock"))
+
+    def test_incremental_backups(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("First", important=False)
+        self.assertEqual(self.backup_manager._copy(), BackupManager.FULL)
+        self.assertEqual(self.backup_manager._copy(), BackupManager.SKIPPED)
+
+        storage.add_note("Second", important=True)
+        storage.delete_note(0)
+        self.assertEqual(self.backup_manager._copy(), BackupManager.DELTA)
+        self.assertTrue(self.backup_manager.verify_backup())
+
+        storage.compact()
+        self.assertEqual(self.backup_manager._copy(), BackupManager.FULL)
+        self.assertFalse(os.path.exists(self.backup_manager.delta_file))
+
+    def test_backups_create_snapshot_generations(self):
+        NoteStorage(self.source_file).add_note("First", important=False)
+        self.backup_manager.create_backup_now()
+
+        generations = self.backup_manager.snapshots.list()
+        self.assertEqual(len(generations), 1)
+        self.assertTrue(self.backup_manager.snapshots.verify(generations[0]["name"]))
+
+    def test_restore_rebuilds_from_snapshot_and_deltas(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("First", important=False)
+        self.backup_manager._copy()
+        storage.add_note("Second", important=True)
+        self.backup_manager._copy()
+
+        restored = os.path.join(self.test_dir, "restored.txt")
+        self.backup_manager.restore(restored)
+
+        self.assertEqual([n["content"] for n in NoteStorage(restored).iter_notes()], ["First", "Second"])
+
+    def _restored_contents(self):
+        restored = os.path.join(self.test_dir, "restored.txt")
+        self.backup_manager.restore(restored)
+        return [n["content"] for n in NoteStorage(restored).iter_notes()]
+
+    def test_restore_ignores_delta_left_by_crash_after_snapshot(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("First", important=False)
+        self.backup_manager._copy()
+        storage.add_note("Second", important=False)
+        self.backup_manager._copy()
+        with open(self.backup_manager.delta_file, "rb") as f:
+            stale_delta = f.read()
+        with open(self.backup_manager.state_file, "rb") as f:
+            stale_state = f.read()
+
+        # Crash after the new snapshot replaced the old one, before the delta was removed and the state saved.
+        storage.compact()
+        self.backup_manager._copy()
+        with open(self.backup_manager.delta_file, "wb") as f:
+            f.write(stale_delta)
+        with open(self.backup_manager.state_file, "wb") as f:
+            f.write(stale_state)
+
+        self.assertEqual(self._restored_contents(), ["First", "Second"])
+        self.assertTrue(self.backup_manager.verify_backup())
+        storage.add_note("Third", important=False)
+        self.assertEqual(self.backup_manager._copy(), BackupManager.FULL)
+        self.assertEqual(self._restored_contents(), ["First", "Second", "Third"])
+
+    def test_delta_appended_without_saved_state_is_not_duplicated(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("First", important=False)
+        self.backup_manager._copy()
+        with open(self.backup_manager.state_file, "rb") as f:
+            committed_state = f.read()
+
+        storage.add_note("Second", important=False)
+        self.backup_manager._copy()
+        # Crash after the delta was fsynced, before the state was saved.
+        with open(self.backup_manager.state_file, "wb") as f:
+            f.write(committed_state)
+
+        self.assertEqual(self._restored_contents(), ["First"])
+        self.assertEqual(self.backup_manager._copy(), BackupManager.DELTA)
+        self.assertEqual(self._restored_contents(), ["First", "Second"])
+
+    def _wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_storage_writes_trigger_debounced_backup(self):
+        storage = NoteStorage(self.source_file)
+        manager = BackupManager(self.source_file, self.backup_file, storage=storage,
+                                debounce_seconds=0.05, max_staleness_seconds=5)
+        copies = []
+        original_copy = manager._copy
+        manager._copy = lambda: copies.append(original_copy())
+        manager.start()
+        try:
+            for i in range(5):
+                storage.add_note(f"Note {i}", important=False)
+            self.assertTrue(self._wait_for(lambda: manager.verify_backup()))
+        finally:
+            manager.stop()
+        self.assertLessEqual(len(copies), 3)
+
+    def test_file_watcher_sees_other_writers_within_staleness_bound(self):
+        NoteStorage(self.source_file).add_note("First", important=False)
+        manager = BackupManager(self.source_file, self.backup_file, interval_seconds=1,
+                                debounce_seconds=0.5, max_staleness_seconds=0.3)
+        manager.start()
+        try:
+            self.assertTrue(self._wait_for(lambda: manager.verify_backup()))
+            first_size = manager._load_state()["size"]
+            other = NoteStorage(self.source_file)
+            deadline = time.monotonic() + 1.0
+            while time.monotonic() < deadline:
+                other.add_note("Busy", important=False)
+                time.sleep(0.02)
+            # never quiet for the debounce window, so only the staleness bound triggers a backup
+            self.assertGreater(manager._load_state()["size"], first_size)
+        finally:
+            manager.stop()
+        self.assertTrue(manager.verify_backup())
+
+    def test_backup_worker_compacts_storage(self):
+        storage = NoteStorage(self.source_file)
+        storage.add_note("Keep", important=False)
+        storage.add_note("Drop", important=False)
+        storage.delete_note(1)
+
+        manager = BackupManager(self.source_file, self.backup_file, storage=storage, compaction_threshold=0.1)
+        manager._compact_storage()
+
+        self.assertEqual(storage.dead_ratio(), 0.0)
+        self.assertEqual(storage.get_note_count(), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
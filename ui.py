@@ -1,16 +1,21 @@
 import os
 import time
-from note_storage import NoteStorage
+from typing import Optional
+from storage_backend import open_storage
+from job_journal import JobJournal
 from note_analyzer import NoteAnalyzer
 from backup_manager import BackupManager
+from search_index import SearchIndex
 
 
 class NoteTakerUI:
     
-    def __init__(self):
-        self.storage = NoteStorage()
-        self.analyzer = NoteAnalyzer()
-        self.backup_manager = BackupManager()
+    def __init__(self, backend: Optional[str] = None):
+        self.storage = open_storage(backend)
+        self.analyzer = NoteAnalyzer(results=self.storage.analysis_results(),
+                                     journal=JobJournal(self.storage.filename + ".jobs"))
+        self.backup_manager = BackupManager(self.storage.filename, storage=self.storage)
+        self.search_index = SearchIndex(self.storage)
         self.print_lock = None
     
     def start(self) -> None:
@@ -35,7 +40,8 @@ class NoteTakerUI:
         print("1. Add Note (Triggers Background Analysis)")
         print("2. View Notes")
         print("3. Delete Note")
-        print("4. Exit")
+        print("4. Search Notes")
+        print("5. Exit")
         print("="*50)
     
     def add_note_interactive(self) -> None:
@@ -48,27 +54,58 @@ class NoteTakerUI:
             important_str = input("Is this note important? (y/n): ").lower().strip()
             important = important_str == 'y'
             
-            self.storage.add_note(note, important)
-            self.analyzer.analyze_note(note, important)
+            note_id = self.storage.add_note(note, important)
+            self.analyzer.analyze_note(note, important, note_id)
             print("Note added and sent for background analysis.")
             time.sleep(1)
         except ValueError as e:
             print(f"Error: {e}")
     
+    def print_note(self, number: int, note: dict) -> None:
+        dt_val = note["datetime"]
+        print(f"--- Note {number} ---")
+        print(f"# Date: {dt_val.strftime('%Y-%m-%d %H:%M:%S') if dt_val else '-'}")
+        print(f"# Note: {note['content']}")
+        print(f"# Important: {note['important']}")
+        analysis = note.get("analysis")
+        if analysis:
+            print(f"# Analysis: {analysis['words']} words, {analysis['priority']}")
+        print()
+
     def view_notes_interactive(self) -> None:
-        notes = self.storage.read_notes_as_blocks()
+        results = self.storage.analysis_results()
+        results.refresh()
+        shown = 0
+        for shown, note in enumerate(self.storage.iter_notes(), 1):
+            self.print_note(shown, dict(note, analysis=results.get(note["id"])))
         
-        if not notes:
+        if not shown:
             print("No notes found.")
-        else:
-            for idx, note in enumerate(notes, 1):
-                print(f"\n--- Note {idx} ---")
-                print(note)
         
         input("\nPress Enter to return to menu...")
     
+    def search_notes_interactive(self) -> None:
+        query = input('Search (word, prefix*, "exact phrase"): ').strip()
+        if not query:
+            return
+        
+        started = time.perf_counter()
+        hits = self.search_index.search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        shown = 0
+        for hit in hits:
+            note = self.storage.get_note(hit.note_id)
+            if note is None:
+                continue
+            shown += 1
+            self.print_note(shown, note)
+        
+        print(f"{shown} result(s) in {elapsed_ms:.1f} ms.")
+        input("\nPress Enter to return to menu...")
+    
     def delete_note_interactive(self) -> None:
-        notes = self.storage.read_notes_as_blocks()
+        notes = self.storage.get_notes_structured(with_analysis=True)
         
         if not notes:
             print("No notes to delete.")
@@ -77,9 +114,7 @@ class NoteTakerUI:
         
         print("\nAvailable notes:\n")
         for idx, note in enumerate(notes, 1):
-            print(f"--- Note {idx} ---")
-            print(note.strip())
-            print()
+            self.print_note(idx, note)
         
         try:
             val = input("Enter the note number to delete (or 0 to cancel): ").strip()
@@ -93,12 +128,14 @@ class NoteTakerUI:
             if note_number == 0:
                 return
             
-            index_to_delete = note_number - 1
+            if note_number > len(notes):
+                print("Invalid note number.")
+                return
             
-            if self.storage.delete_note(index_to_delete):
+            if self.storage.delete_note_by_id(notes[note_number - 1]["id"]):
                 print("Note deleted successfully.")
             else:
-                print("Invalid note number.")
+                print("Note was already deleted.")
         except ValueError:
             print("Invalid input.")
         
@@ -110,7 +147,7 @@ class NoteTakerUI:
         try:
             while True:
                 self.show_menu()
-                choice = input("Choose an option (1-4): ").strip()
+                choice = input("Choose an option (1-5): ").strip()
                 
                 if choice == '1':
                     self.clear_screen()
@@ -124,6 +161,10 @@ class NoteTakerUI:
                     self.delete_note_interactive()
                     self.clear_screen()
                 elif choice == '4':
+                    self.clear_screen()
+                    self.search_notes_interactive()
+                    self.clear_screen()
+                elif choice == '5':
                     break
                 else:
                     print("Invalid choice. Please try again.")